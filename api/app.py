@@ -1,27 +1,44 @@
 # api/app.py
+import gzip
+import json
+import logging
 import os
-import pickle
 import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from collections import defaultdict
+from datetime import datetime, timezone
+from itertools import islice
 from typing import Optional
 
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request, UploadFile, File, Query
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
 
-from ingest.embed import get_embedding
-from ingest.load_pdf import load_pdfs
+from ingest.embed import get_embedding, get_embeddings
 from ingest.chunk import chunk_pdf_documents
 
-from rag.vectorstore import FaissVectorStore
-from rag.generator import generate_answer
-from rag.question_type import classify_question
-
-# =============================
-# Paths
-# =============================
-INDEX_DIR = "rag/index"
-FAISS_PATH = os.path.join(INDEX_DIR, "faiss.index")
-META_PATH = os.path.join(INDEX_DIR, "metadata.pkl")
+from rag.collection_store import (
+    CollectionStore,
+    DEFAULT_COLLECTION,
+    index_paths,
+    manifest_path,
+    papers_dir,
+    validate_name,
+)
+from rag.confidence import NOT_FOUND_ANSWER, GateStats, relevance
+from rag.context import estimate_tokens
+from rag.generator import generate_answer, preload_model
+from rag import metrics
+from rag.metrics import StageTimer, observe_cache, observe_generation
+from rag.manifest import chunk_ids, file_entry, update_manifest
+from rag.paper_diff import DIFF_THRESHOLD, DiffCache
+from rag import pipeline
+from rag.pipeline import PipelineError
+from rag.routing import ROUTES, RouteStats
+from rag.slow_log import SlowQueryLog
+from rag.summaries import SummaryCache
 
 # =============================
 # App
@@ -33,73 +50,393 @@ app = FastAPI(
 )
 
 chat_memory = defaultdict(list)
+gate_stats = GateStats()
+route_stats = RouteStats()
+slow_log = SlowQueryLog()
+# Summaries go through the same generation wrapper as answers
+summary_cache = SummaryCache(generate=lambda **kw: safe_generate_answer(**kw))
+diff_cache = DiffCache()
+
+# rag.* loggers (e.g. the gated-query log) go to stderr next to uvicorn's
+_rag_logger = logging.getLogger("rag")
+if not _rag_logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(levelname)s: %(message)s"))
+    _rag_logger.addHandler(_handler)
+    _rag_logger.setLevel(logging.INFO)
+
+# Upper bound on concurrent generations per /ask_batch call
+ASK_BATCH_MAX_CONCURRENCY = int(os.getenv("ASK_BATCH_MAX_CONCURRENCY", "8"))
+ASK_BATCH_MAX_QUESTIONS = 1000
+ASK_BATCH_MAX_TOP_K = 100
+
+# Data endpoints gzip JSON bodies at least this large when the client accepts it
+GZIP_MIN_BYTES = int(os.getenv("RAG_GZIP_MIN_BYTES", "1024"))
+
+# Chunks per /paper_text page at most
+PAPER_TEXT_MAX_LIMIT = 500
+
+# HTTP error detail per failed pipeline stage (rag.pipeline.PipelineError)
+STAGE_ERRORS = {
+    "embed": "Failed to embed question",
+    "search": "Retrieval error",
+    "generate": "Generation error",
+}
+
+# Deepest /search page: FAISS has no cursor, so a page costs offset + limit hits
+SEARCH_MAX_OFFSET = 10_000
 
 
 # =============================
 # Models
 # =============================
-class QuestionRequest(BaseModel):
+class FilterFields(BaseModel):
+    """
+    Optional retrieval filters, applied inside FAISS before ranking.
+    """
+    collections: Optional[list[str]] = None
+    sources: Optional[list[str]] = None
+    pages: Optional[list[tuple[int, int]]] = None
+    uploaded_after: Optional[datetime] = None
+    uploaded_before: Optional[datetime] = None
+
+
+class QuestionRequest(FilterFields):
     question: str
     session_id: str
     role: str = "student"
+    # Return per-stage timings (ms) with the answer
+    timings: bool = False
+
+
+class BatchQuestionRequest(FilterFields):
+    questions: list[str]
+    role: str = "student"
+    # Chunks per question; None uses each question's route
+    top_k: Optional[int] = None
+    concurrency: int = 4
+
+
+class SearchRequest(FilterFields):
+    query: str
+    offset: int = 0
+    limit: int = 10
+    timings: bool = False
 
 
 class AnswerResponse(BaseModel):
     answer: str
     sources: list[str]
+    # True when retrieval was not relevant enough to call the LLM
+    gated: bool = False
+    # Route the question took, see rag.routing
+    route: Optional[str] = None
+    # Per-stage milliseconds, when the request asked for them
+    timings: Optional[dict] = None
 
 
 class CompareRequest(BaseModel):
     paper_a: str
     paper_b: str
     role: str = "student"
+    collections: Optional[list[str]] = None
+
+
+class PaperDiffRequest(BaseModel):
+    paper_a: str
+    paper_b: str
+    collections: Optional[list[str]] = None
+    # Cosine score for two chunks to match (default RAG_DIFF_THRESHOLD)
+    threshold: Optional[float] = None
 
 
 # =============================
-# Startup: load vector DB
+# Startup: load vector DB in the background
 # =============================
-@app.on_event("startup")
+# Empty until the loader thread swaps in the indexes on disk
+store = CollectionStore()
+# Part of every index-version ETag (snapshot versions restart at launch)
+STARTED_AT = time.time_ns()
+
+# Set once indexes are loaded and warmed up; /readyz reports it
+index_ready = threading.Event()
+load_state = {"status": "loading", "error": None, "load_ms": None, "warmup_ms": None}
+
+# Warm up after loading: touch index pages, preload the Ollama models
+WARMUP = os.getenv("RAG_WARMUP", "1") != "0"
+# Seconds each Ollama warmup request may take before startup goes on without it
+WARMUP_TIMEOUT = float(os.getenv("RAG_WARMUP_TIMEOUT", "120"))
+
+# Paths served while the index is still loading
+PROBE_PATHS = {"/", "/livez", "/readyz", "/metrics", "/docs", "/openapi.json"}
+
+logger = logging.getLogger("rag.api")
+
+
+def warmup():
+    """
+    One query through every shard (faults in index and vector pages), and
+    a request to each Ollama model so it is resident before traffic. Ollama
+    errors and timeouts (RAG_WARMUP_TIMEOUT) are logged, not fatal: the API
+    can serve retrieval without it. Returns the failures, if any.
+    """
+    failures = []
+    try:
+        get_embedding("warmup", timeout=WARMUP_TIMEOUT)
+    except Exception as e:
+        failures.append(f"Embedding model warmup failed: {e}")
+
+    store.warmup()
+
+    try:
+        preload_model(timeout=WARMUP_TIMEOUT)
+    except Exception as e:
+        failures.append(f"Generation model warmup failed: {e}")
+
+    for failure in failures:
+        logger.warning(failure)
+    return failures
+
+
 def load_vector_db():
     global store
 
-    if not os.path.exists(FAISS_PATH) or not os.path.exists(META_PATH):
-        raise RuntimeError("Run `python -m rag.ingest_index` first")
+    try:
+        t0 = time.perf_counter()
+        # Every collection with an index on disk; storage mode per shard is
+        # taken from its saved index
+        store = CollectionStore.load_all()
+        load_state["load_ms"] = round(1000 * (time.perf_counter() - t0), 1)
+
+        if not store.names():
+            logger.warning("No index on disk yet: starting empty, upload papers to add some")
+
+        failures = []
+        if WARMUP:
+            t0 = time.perf_counter()
+            failures = warmup()
+            load_state["warmup_ms"] = round(1000 * (time.perf_counter() - t0), 1)
+    except Exception as e:
+        logger.exception("Failed to load indexes")
+        load_state.update(status="failed", error=str(e))
+        return
 
-    with open(META_PATH, "rb") as f:
-        metadata = pickle.load(f)
+    # Ollama was unreachable or too slow: serve anyway, but say so
+    if failures:
+        load_state.update(status="degraded", error="; ".join(failures))
+    else:
+        load_state["status"] = "ready"
+    index_ready.set()
 
-    store = FaissVectorStore(dim=768)
-    store.load(FAISS_PATH, metadata)
+
+@app.on_event("startup")
+def start_loading():
+    threading.Thread(target=load_vector_db, name="index-loader", daemon=True).start()
+
+
+@app.middleware("http")
+async def wait_for_index(request: Request, call_next):
+    """Answer 503 (retry shortly) instead of queueing requests during loading."""
+    if not index_ready.is_set() and request.url.path not in PROBE_PATHS:
+        return JSONResponse(
+            status_code=503,
+            content={"detail": f"Index is {load_state['status']}"},
+            headers={"Retry-After": "1"},
+        )
+    return await call_next(request)
 
 
 # =============================
 # Helpers
 # =============================
 def normalize_scores(chunks):
-    scores = [c["score"] for c in chunks]
-    max_s, min_s = max(scores), min(scores)
-
+    """
+    Set each chunk's "confidence" to its calibrated absolute relevance
+    (0–100, see rag.confidence), so scores are comparable across queries.
+    """
     for c in chunks:
-        if max_s == min_s:
-            c["confidence"] = 100.0
-        else:
-            c["confidence"] = round(
-                100 * (c["score"] - min_s) / (max_s - min_s), 1
-            )
+        c["confidence"] = relevance(c["score"])
     return chunks
 
 
-def safe_generate_answer(context: str, question: str, mode: Optional[str] = None, role: Optional[str] = None) -> str:
+def nearest_papers(chunks) -> list[str]:
+    """Best relevance per paper, best first — shown when a query is gated."""
+    best = {}
+    for c in normalize_scores(chunks):
+        if c["source"] not in best or c["confidence"] > best[c["source"]]:
+            best[c["source"]] = c["confidence"]
+
+    return [
+        f"{source} — {conf}%"
+        for source, conf in sorted(best.items(), key=lambda kv: -kv[1])
+    ]
+
+
+def format_sources(chunks) -> list[str]:
+    """
+    One line per (paper, page), keeping the best confidence. Expects
+    chunks that went through normalize_scores.
+    """
+    seen = {}
+    for c in chunks:
+        key = (c["source"], c["page"])
+        if key not in seen or c["confidence"] > seen[key]["confidence"]:
+            seen[key] = c
+
+    return [
+        f"{c['source']} (page {c['page']}) — {c['confidence']}%"
+        for c in seen.values()
+    ]
+
+
+def search_filters(req: FilterFields) -> Optional[dict]:
+    """
+    Convert the filter fields of a request into the vector store's filter
+    dict, or None when no filter is set.
+    """
+    filters = {}
+    if req.collections:
+        filters["collections"] = req.collections
+    if req.sources:
+        filters["sources"] = req.sources
+    if req.pages:
+        filters["pages"] = req.pages
+    if req.uploaded_after is not None:
+        filters["uploaded_after"] = req.uploaded_after.timestamp()
+    if req.uploaded_before is not None:
+        filters["uploaded_before"] = req.uploaded_before.timestamp()
+    return filters or None
+
+
+def collection_chunks(collections: Optional[list[str]] = None):
+    """
+    Iterate chunk metadata of the selected collections (all by default).
+    Unknown collection names are reported as 404.
+    """
+    try:
+        return store.iter_metadata(collections)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+
+
+def index_version() -> str:
+    """
+    ETag for data derived from the indexes. The process start time is part
+    of it, since snapshot versions restart from zero on every launch.
+    """
+    return f"{STARTED_AT:x}-{store.version()}"
+
+
+def conditional_json(request: Request, build) -> Response:
+    """
+    JSON response tagged with the index version. If the client's
+    If-None-Match already holds that tag, answer 304 without calling
+    `build`; otherwise gzip the body when it is large and accepted.
+
+    `build` must read the indexes itself: the version is taken first, so
+    a concurrent write can only make the tag older than the data.
+    """
+    version = index_version()
+    etag = f'W/"{version}"'
+    headers = {
+        "ETag": etag,
+        "X-Index-Version": version,
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+
+    known = {t.strip().removeprefix("W/") for t in request.headers.get("if-none-match", "").split(",")}
+    if f'"{version}"' in known or "*" in known:
+        return Response(status_code=304, headers=headers)
+
+    body = json.dumps(build()).encode("utf-8")
+    if len(body) >= GZIP_MIN_BYTES and "gzip" in request.headers.get("accept-encoding", ""):
+        body = gzip.compress(body, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def selected_papers(collections: Optional[list[str]] = None) -> list:
+    """(collection, source) of every paper in the selected collections; 404 on unknown names."""
+    try:
+        return store.papers(collections)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+
+
+def summary_papers(question: str, req: FilterFields, max_papers: int) -> list:
+    """
+    Papers a summary question is about, as (collection, source): the
+    `sources` filter, else papers named in the question, else every paper
+    in the selected collections. Empty if that is more than `max_papers`.
+    """
+    papers = selected_papers(req.collections)
+
+    if req.sources:
+        papers = [p for p in papers if p[1] in req.sources]
+    else:
+        q = question.lower()
+        named = [
+            p for p in papers
+            if p[1].lower() in q or os.path.splitext(p[1])[0].lower() in q
+        ]
+        papers = named or papers
+
+    return papers if 0 < len(papers) <= max_papers else []
+
+
+def summaries_for(req: FilterFields, role: str):
+    """
+    `summaries` function for rag.pipeline.ask: answers a summary question
+    from the precomputed summaries of the papers it is about (see
+    summary_papers), or returns None so it falls back to retrieval.
+    """
+    def serve(question: str, max_papers: int):
+        papers = summary_papers(question, req, max_papers)
+        if not papers:
+            return None
+
+        parts, all_cached, usages = [], True, []
+        for collection, source in papers:
+            chunks = store.paper_chunks(collection, source)
+            usage = {}
+            summary, cached = summary_cache.get(collection, source, chunks, role, usage=usage)
+            usages.append(usage)
+            observe_cache("summary", cached)
+            observe_generation(usage)
+            all_cached = all_cached and cached
+            parts.append(summary if len(papers) == 1 else f"### {source}\n{summary}")
+
+        return {
+            "answer": "\n\n".join(parts),
+            "sources": [f"{source} — summary" for _, source in papers],
+            "papers": papers,
+            "cached": all_cached,
+            "usage": usages,
+        }
+
+    return serve
+
+
+def log_if_slow(endpoint: str, timer: StageTimer, request: dict, **fields):
+    """Write a slow-query log entry (rag.slow_log) if the request was slow."""
+    elapsed = timer.elapsed_ms()
+    if slow_log.should_log(elapsed):
+        slow_log.record(endpoint, elapsed, request, timings=timer.timings, **fields)
+
+
+def safe_generate_answer(context: str, question: str, mode: Optional[str] = None, role: Optional[str] = None, **options) -> str:
     """
     Call generate_answer safely:
     - Try calling with role if provided
     - Fall back gracefully to older signatures if needed
+    Extra options (max_tokens, usage) are passed through.
     """
     try:
         if role is None:
-            return generate_answer(context=context, question=question, mode=mode)
+            return generate_answer(context=context, question=question, mode=mode, **options)
         else:
-            return generate_answer(context=context, question=question, mode=mode, role=role)
+            return generate_answer(context=context, question=question, mode=mode, role=role, **options)
     except TypeError:
         # signature might not accept role or mode keyword names; try fewer args
         try:
@@ -114,7 +451,27 @@ def safe_generate_answer(context: str, question: str, mode: Optional[str] = None
 # =============================
 @app.get("/")
 def health():
-    return {"status": "running"}
+    return {"status": "running" if index_ready.is_set() else load_state["status"]}
+
+
+@app.get("/livez")
+def liveness():
+    """The process is up and serving HTTP (even while indexes load)."""
+    return {"status": "alive"}
+
+
+@app.get("/readyz")
+def readiness():
+    """
+    200 once indexes are loaded and warmed up (status "degraded" if an
+    Ollama model could not be warmed up), 503 before (or if loading failed).
+    """
+    body = {**load_state}
+    if not index_ready.is_set():
+        return JSONResponse(status_code=503, content=body)
+
+    body["collections"] = store.names()
+    return body
 
 
 # -----------------------------
@@ -122,6 +479,12 @@ def health():
 # -----------------------------
 @app.post("/ask", response_model=AnswerResponse)
 def ask_question(req: QuestionRequest):
+    """
+    Answer a question, routed by its type (see rag.routing): summary
+    questions are served from precomputed per-paper summaries, fact and
+    explanation questions get their own retrieval and answer budgets.
+    The pipeline itself is rag.pipeline.ask, shared with the CLI tools.
+    """
     question = req.question.strip()
     session_id = req.session_id
     role = req.role.lower()
@@ -129,96 +492,340 @@ def ask_question(req: QuestionRequest):
     if not question:
         raise HTTPException(status_code=400, detail="Empty question")
 
+    # Stage timings are also kept for the slow-query log
+    timer = StageTimer(trace=req.timings or slow_log.enabled)
     history = chat_memory[session_id]
+    logged_request = req.model_dump(mode="json")
+    filters = search_filters(req)
 
-    # Embed query
     try:
-        query_embedding = get_embedding(question)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to embed question: {e}")
+        result = pipeline.ask(
+            store, question,
+            role=role,
+            filters=filters,
+            history=history,
+            summaries=summaries_for(req, role),
+            generate=safe_generate_answer,
+            timer=timer,
+        )
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    except PipelineError as e:
+        raise HTTPException(status_code=500, detail=f"{STAGE_ERRORS[e.stage]}: {e}")
+
+    route_name = result["route"]
+
+    if result.get("summary"):
+        history.append(f"User: {question}")
+        history.append(f"Assistant: {result['answer']}")
+        timer.finish("ask", route_name)
+        usages = result["usage"]
+        route_stats.record(route_name, timer.elapsed_ms(), usages, cached=result["cached"])
+        log_if_slow(
+            "ask", timer, logged_request, route=route_name,
+            chunks=[{"collection": c, "source": s} for c, s in result["papers"]],
+            usage=usages[0] if len(usages) == 1 else None,
+        )
+        return AnswerResponse(
+            answer=result["answer"], sources=result["sources"], route=route_name,
+            timings=timer.timings if req.timings else None,
+        )
 
-    # Retrieve using MMR
-    try:
-        top_chunks = store.search_mmr(query_embedding, top_k=3)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Retrieval error: {e}")
+    top_chunks = result["chunks"]
+    gate_stats.record(
+        result["gated"], question,
+        max((c["confidence"] for c in top_chunks), default=None)
+    )
 
-    if not top_chunks:
+    if result["gated"]:
+        metrics.GATED_REQUESTS.inc()
+        timer.finish("ask", route_name)
+        route_stats.record(route_name, timer.elapsed_ms())
+        log_if_slow(
+            "ask", timer, logged_request,
+            route=route_name, chunks=top_chunks, filters=filters,
+        )
         return AnswerResponse(
-            answer="I could not find the answer in the documents.",
-            sources=[]
+            answer=NOT_FOUND_ANSWER,
+            sources=nearest_papers(top_chunks),
+            gated=True,
+            route=route_name,
+            timings=timer.timings if req.timings else None,
         )
 
-    top_chunks = normalize_scores(top_chunks)
+    answer, usage = result["answer"], result["usage"]
+    observe_generation(usage)
 
-    # Conversation memory
-    conversation = "\n".join(history[-6:])
+    history.append(f"User: {question}")
+    history.append(f"Assistant: {answer}")
+    timer.finish("ask", route_name)
+    route_stats.record(route_name, timer.elapsed_ms(), usage)
+    log_if_slow(
+        "ask", timer, logged_request,
+        route=route_name, chunks=top_chunks, filters=filters,
+        usage=usage, context_tokens=estimate_tokens(result["context"]),
+    )
 
-    context = conversation + "\n\n" + "\n\n".join(
-        f"[{c['source']} | page {c['page']}]\n{c['text']}"
-        for c in top_chunks
+    return AnswerResponse(
+        answer=answer,
+        sources=format_sources(result["context_chunks"]),
+        route=route_name,
+        timings=timer.timings if req.timings else None,
     )
 
-    mode = classify_question(question)
 
-    # Generate answer using safe wrapper
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Stage latencies, Ollama token counts and cache hit rates (Prometheus text format)."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/routes")
+def list_routes():
+    """Routing table and per-route latency / token usage since startup."""
+    return {"routes": ROUTES, "stats": route_stats.snapshot()}
+
+
+# -----------------------------
+# Ask (batch)
+# -----------------------------
+@app.post("/ask_batch")
+def ask_batch(req: BatchQuestionRequest):
+    """
+    Answer many independent questions (no chat memory) in one call.
+
+    Each question takes the same route and pipeline as /ask
+    (rag.pipeline), but all questions are embedded in one batched call and
+    retrieved with one matrix MMR search per route; generation runs with
+    bounded concurrency. `top_k` overrides every route's chunk count.
+    Results stream back as NDJSON, one line per question in completion
+    order, each carrying its input `index`, route and timings in
+    milliseconds. Embedding and search timings are for the whole batch.
+    """
+    role = req.role.lower()
+    questions = [q.strip() for q in req.questions]
+
+    if not questions:
+        raise HTTPException(status_code=400, detail="No questions")
+    if len(questions) > ASK_BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {ASK_BATCH_MAX_QUESTIONS} questions per batch")
+    if req.top_k is not None and not 1 <= req.top_k <= ASK_BATCH_MAX_TOP_K:
+        raise HTTPException(status_code=400, detail=f"top_k must be between 1 and {ASK_BATCH_MAX_TOP_K}")
+
+    concurrency = max(1, min(req.concurrency, ASK_BATCH_MAX_CONCURRENCY))
+    asked = [i for i, q in enumerate(questions) if q]
+    filters = search_filters(req)
+    summaries = summaries_for(req, role)
+
+    t0 = time.perf_counter()
     try:
-        answer = safe_generate_answer(context=context, question=question, mode=mode, role=role)
+        embeddings = get_embeddings([questions[i] for i in asked]) if asked else []
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Generation error: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to embed questions: {e}")
+    embed_ms = 1000 * (time.perf_counter() - t0)
 
-    history.append(f"User: {question}")
-    history.append(f"Assistant: {answer}")
+    # Summary questions are retrieved for their fallback route up front,
+    # in case their summaries cannot serve them
+    routes = [pipeline.with_top_k(pipeline.route_question(questions[i])[1], req.top_k) for i in asked]
+    t0 = time.perf_counter()
+    try:
+        retrieved = pipeline.retrieve_batch(store, embeddings, routes, filters) if asked else []
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Retrieval error: {e}")
+    search_ms = 1000 * (time.perf_counter() - t0)
 
-    # Deduplicate sources
-    seen = {}
-    for c in top_chunks:
-        key = (c["source"], c["page"])
-        if key not in seen or c["confidence"] > seen[key]["confidence"]:
-            seen[key] = c
+    top_chunks = dict(zip(asked, retrieved))
+    batch_timings = {"embed_ms": round(embed_ms, 1), "search_ms": round(search_ms, 1)}
+    metrics.STAGE_SECONDS.observe(embed_ms / 1000, stage="embed_batch")
+    metrics.STAGE_SECONDS.observe(search_ms / 1000, stage="search_batch")
+    queued_at = time.perf_counter()
 
-    sources = [
-        f"{c['source']} (page {c['page']}) — {c['confidence']}%"
-        for c in seen.values()
-    ]
+    def answer_one(i):
+        question = questions[i]
+        started = time.perf_counter()
+        item = {"index": i, "question": question}
+
+        if not question:
+            item["error"] = "Empty question"
+        else:
+            try:
+                result = pipeline.ask(
+                    store, question,
+                    role=role,
+                    filters=filters,
+                    chunks=top_chunks[i],
+                    top_k=req.top_k,
+                    summaries=summaries,
+                    generate=safe_generate_answer,
+                )
+            except PipelineError as e:
+                item["error"] = f"{STAGE_ERRORS[e.stage]}: {e}"
+            except Exception as e:
+                # e.g. a summary generation failing
+                item["error"] = f"Generation error: {e}"
+            else:
+                item["route"] = result["route"]
+                if result.get("summary"):
+                    item.update(answer=result["answer"], sources=result["sources"])
+                else:
+                    chunks = result["chunks"]
+                    gate_stats.record(
+                        result["gated"], question,
+                        max((c["confidence"] for c in chunks), default=None)
+                    )
+                    if result["gated"]:
+                        metrics.GATED_REQUESTS.inc()
+                        item.update(answer=NOT_FOUND_ANSWER, sources=nearest_papers(chunks), gated=True)
+                    else:
+                        observe_generation(result["usage"])
+                        item.update(answer=result["answer"], sources=format_sources(result["context_chunks"]))
+
+        item["timings"] = {
+            **batch_timings,
+            "queue_ms": round(1000 * (started - queued_at), 1),
+            "generate_ms": round(1000 * (time.perf_counter() - started), 1),
+        }
+        return item
+
+    def stream():
+        pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="ask-batch")
+        try:
+            futures = [pool.submit(answer_one, i) for i in range(len(questions))]
+            for future in as_completed(futures):
+                yield json.dumps(future.result()) + "\n"
+        finally:
+            # Client went away: drop generations that have not started
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+# -----------------------------
+# Search (retrieval only)
+# -----------------------------
+@app.post("/search")
+def search_chunks(req: SearchRequest):
+    query = req.query.strip()
+
+    if not query:
+        raise HTTPException(status_code=400, detail="Empty query")
+    if not 0 <= req.offset <= SEARCH_MAX_OFFSET or not 1 <= req.limit <= 100:
+        raise HTTPException(
+            status_code=400, detail=f"Need 0 <= offset <= {SEARCH_MAX_OFFSET} and 1 <= limit <= 100"
+        )
+
+    filters = search_filters(req)
+    timer = StageTimer(trace=req.timings)
+
+    try:
+        total = store.count(filters)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+
+    page = []
+    if req.offset < total:
+        try:
+            with timer.stage("embed"):
+                query_embedding = get_embedding(query)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to embed query: {e}")
 
-    return AnswerResponse(answer=answer, sources=sources)
+        # FAISS has no cursor: fetch everything up to the end of the page
+        try:
+            with timer.stage("search"):
+                hits = store.search(
+                    query_embedding, top_k=min(req.offset + req.limit, total), filters=filters
+                )
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=e.args[0])
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Retrieval error: {e}")
+        page = hits[req.offset:]
+
+    next_offset = req.offset + req.limit
+    if next_offset >= total:
+        next_offset = None
+
+    timer.finish("search")
+    response = {
+        "results": page,
+        "offset": req.offset,
+        "limit": req.limit,
+        "total": total,
+        "next_offset": next_offset,
+    }
+    if req.timings:
+        response["timings"] = timer.timings
+    return response
 
 
 # -----------------------------
 # Upload PDF
 # -----------------------------
 @app.post("/upload")
-def upload_pdf(file: UploadFile = File(...)):
+def upload_pdf(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    collection: str = DEFAULT_COLLECTION,
+):
+    from ingest.load_pdf import load_pdf  # pypdf is only needed here
+
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDFs allowed")
 
-    os.makedirs("data/papers", exist_ok=True)
-    pdf_path = f"data/papers/{file.filename}"
+    try:
+        pdf_dir = papers_dir(validate_name(collection))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    os.makedirs(pdf_dir, exist_ok=True)
+    pdf_path = os.path.join(pdf_dir, file.filename)
 
     with open(pdf_path, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
 
-    documents = load_pdfs("data/papers")
-    new_docs = [d for d in documents if d["source"] == file.filename]
+    new_docs = load_pdf(pdf_path)
 
     if not new_docs:
         raise HTTPException(status_code=400, detail="Failed to read PDF")
 
     new_chunks = chunk_pdf_documents(new_docs)
 
-    for c in new_chunks:
-        emb = get_embedding(c["text"])
-        store.add(emb, c)
+    # Manifest entry, so `rag.ingest_index` treats this file as indexed
+    entry = file_entry(pdf_path)
+    entry["chunk_ids"] = chunk_ids(entry["sha256"], len(new_chunks))
 
-    store.save(FAISS_PATH)
-    with open(META_PATH, "wb") as f:
-        pickle.dump(store.metadata, f)
+    uploaded_at = time.time()
+    for c, chunk_id in zip(new_chunks, entry["chunk_ids"]):
+        c["uploaded_at"] = uploaded_at
+        c["chunk_id"] = chunk_id
+
+    # Embed everything first, then publish one snapshot: concurrent /ask
+    # calls keep searching the previous snapshot until the swap.
+    embeddings = [get_embedding(c["text"]) for c in new_chunks]
+
+    # `rag.ingest_index` may have rewritten the collection since it was
+    # loaded: build on its version rather than overwrite it with ours
+    if store.changed_on_disk(collection):
+        store.reload(collection)
+
+    # Re-uploading a file replaces its chunks, in the same snapshot
+    store.get_or_create(collection).replace_sources([file.filename], embeddings, new_chunks)
+
+    store.save(collection)
+    update_manifest(manifest_path(collection), {file.filename: entry})
+
+    # Precompute the summary served to summary-type questions
+    background_tasks.add_task(summary_cache.get, collection, file.filename, new_chunks)
 
     return {
         "status": "success",
         "file": file.filename,
-        "chunks_added": len(new_chunks)
+        "collection": collection,
+        "chunks_added": len(new_chunks),
+        "index_version": index_version(),
     }
 
 
@@ -226,13 +833,16 @@ def upload_pdf(file: UploadFile = File(...)):
 # Summarize
 # -----------------------------
 @app.post("/summarize")
-def summarize_papers(role: str = "student"):
-    if not store.metadata:
+def summarize_papers(role: str = "student", collections: Optional[list[str]] = Query(None)):
+    timer = StageTimer(trace=slow_log.enabled)
+    with timer.stage("context"):
+        first_chunks = list(islice(collection_chunks(collections), 8))
+    if not first_chunks:
         raise HTTPException(status_code=400, detail="No papers indexed")
 
     context = "\n\n".join(
         f"[{c['source']} | page {c['page']}]\n{c['text']}"
-        for c in store.metadata[:8]
+        for c in first_chunks
     )
 
     summary_prompt = (
@@ -243,11 +853,21 @@ def summarize_papers(role: str = "student"):
         "- Conclusions"
     )
 
+    usage = {}
     try:
-        summary = safe_generate_answer(context=context, question=summary_prompt, mode="summarize", role=role)
+        with timer.stage("generate"):
+            summary = safe_generate_answer(
+                context=context, question=summary_prompt, mode="summarize", role=role, usage=usage
+            )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Summarization error: {e}")
+    observe_generation(usage)
 
+    timer.finish("summarize")
+    log_if_slow(
+        "summarize", timer, {"role": role, "collections": collections},
+        chunks=first_chunks, usage=usage, context_tokens=estimate_tokens(context),
+    )
     return {"summary": summary}
 
 
@@ -257,9 +877,15 @@ def summarize_papers(role: str = "student"):
 @app.post("/compare")
 def compare_papers(req: CompareRequest):
     role = req.role.lower()
+    timer = StageTimer(trace=slow_log.enabled)
 
-    chunks_a = [c for c in store.metadata if c["source"] == req.paper_a]
-    chunks_b = [c for c in store.metadata if c["source"] == req.paper_b]
+    chunks_a, chunks_b = [], []
+    with timer.stage("context"):
+        for c in collection_chunks(req.collections):
+            if c["source"] == req.paper_a:
+                chunks_a.append(c)
+            elif c["source"] == req.paper_b:
+                chunks_b.append(c)
 
     if not chunks_a or not chunks_b:
         raise HTTPException(status_code=400, detail="One or both papers not found")
@@ -280,41 +906,163 @@ def compare_papers(req: CompareRequest):
         "- Key differences"
     )
 
+    usage = {}
     try:
-        answer = safe_generate_answer(context=context, question=compare_prompt, mode="compare", role=role)
+        with timer.stage("generate"):
+            answer = safe_generate_answer(
+                context=context, question=compare_prompt, mode="compare", role=role, usage=usage
+            )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Comparison generation error: {e}")
+    observe_generation(usage)
 
+    timer.finish("compare")
+    log_if_slow(
+        "compare", timer, req.model_dump(mode="json"),
+        chunks=chunks_a[:5] + chunks_b[:5], usage=usage, context_tokens=estimate_tokens(context),
+    )
     return {"comparison": answer}
 
 
+# -----------------------------
+# Semantic paper diff
+# -----------------------------
+def find_paper(source: str, collections: Optional[list[str]] = None):
+    """Name of the first selected collection holding `source`, else None."""
+    return next((name for name, src in selected_papers(collections) if src == source), None)
+
+
+@app.post("/paper_diff")
+def paper_diff(req: PaperDiffRequest):
+    """
+    Chunk-level semantic diff of two papers from their stored vectors:
+    aligned matching sections, content unique to each paper and overall
+    similarity scores (see rag.paper_diff). No LLM call.
+    """
+    name_a = find_paper(req.paper_a, req.collections)
+    name_b = find_paper(req.paper_b, req.collections)
+    if name_a is None or name_b is None:
+        raise HTTPException(status_code=400, detail="One or both papers not found")
+
+    threshold = DIFF_THRESHOLD if req.threshold is None else req.threshold
+    timer = StageTimer()
+    with timer.stage("diff"):
+        chunks_a, vectors_a = store.paper_vectors(name_a, req.paper_a)
+        chunks_b, vectors_b = store.paper_vectors(name_b, req.paper_b)
+        if not chunks_a or not chunks_b:
+            # Removed since find_paper looked
+            raise HTTPException(status_code=400, detail="One or both papers not found")
+        diff, cached = diff_cache.get(chunks_a, vectors_a, chunks_b, vectors_b, threshold)
+    observe_cache("paper_diff", cached)
+    timer.finish("paper_diff")
+
+    return {
+        "paper_a": {"source": req.paper_a, "collection": name_a},
+        "paper_b": {"source": req.paper_b, "collection": name_b},
+        "cached": cached,
+        **diff,
+    }
+
+
 # -----------------------------
 # List Papers
 # -----------------------------
 @app.get("/papers")
-def list_papers():
-    if not store.metadata:
-        return {"papers": []}
+def list_papers(request: Request, collections: Optional[list[str]] = Query(None)):
+    return conditional_json(
+        request, lambda: {"papers": sorted({src for _, src in selected_papers(collections)})}
+    )
+
+
+@app.get("/paper_stats")
+def list_paper_stats(request: Request, collections: Optional[list[str]] = Query(None)):
+    """Per-paper chunk, page and character counts and upload time."""
+    def build():
+        try:
+            stats = store.paper_stats(collections)
+        except KeyError as e:
+            raise HTTPException(status_code=404, detail=e.args[0])
+        for p in stats:
+            if p["uploaded_at"] is not None:
+                p["uploaded_at"] = datetime.fromtimestamp(p["uploaded_at"], timezone.utc).isoformat(timespec="seconds")
+        return {"papers": stats}
 
-    papers = sorted({c["source"] for c in store.metadata})
-    return {"papers": papers}
+    return conditional_json(request, build)
+
+
+@app.get("/index_version")
+def get_index_version():
+    """Current index version; changes whenever an index is modified."""
+    return {"version": index_version()}
 
 
 # -----------------------------
-# Paper text helper (for UI diff)
+# List Collections
 # -----------------------------
-@app.get("/paper_text")
-def get_paper_text(name: str):
+@app.get("/collections")
+def list_collections(request: Request):
+    return conditional_json(request, lambda: {"collections": store.stats()})
+
+
+@app.post("/collections/{name}/reload")
+def reload_collection(name: str):
     """
-    Return the concatenated text of all chunks for a given paper name.
-    Used by the UI to compute diffs / local summaries. Safe and read-only.
+    Load a collection from disk again and swap it in, e.g. after
+    `python -m rag.ingest_index --full` rebuilt it while the API was up.
     """
-    if not store.metadata:
-        return {"text": ""}
+    try:
+        validate_name(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not os.path.exists(index_paths(name)[0]):
+        raise HTTPException(status_code=404, detail=f"No index on disk for collection {name!r}")
+
+    t0 = time.perf_counter()
+    try:
+        reloaded = store.reload(name)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to load collection: {e}")
+
+    return {
+        "collection": name,
+        "chunks": len(reloaded.metadata),
+        "load_ms": round(1000 * (time.perf_counter() - t0), 1),
+        "index_version": index_version(),
+    }
 
-    chunks = [c for c in store.metadata if c["source"] == name]
-    if not chunks:
-        return {"text": ""}
 
-    text = "\n\n".join(c["text"] for c in chunks)
-    return {"text": text}
+# -----------------------------
+# Paper text helper
+# -----------------------------
+@app.get("/paper_text")
+def get_paper_text(
+    request: Request,
+    name: str,
+    collections: Optional[list[str]] = Query(None),
+    offset: int = 0,
+    limit: Optional[int] = None,
+):
+    """
+    Return the concatenated text of a paper's chunks, optionally one page
+    of `limit` chunks starting at chunk `offset`. Safe and read-only.
+    """
+    if offset < 0 or (limit is not None and not 1 <= limit <= PAPER_TEXT_MAX_LIMIT):
+        raise HTTPException(
+            status_code=400, detail=f"Need offset >= 0 and 1 <= limit <= {PAPER_TEXT_MAX_LIMIT}"
+        )
+    def build():
+        chunks = [
+            c
+            for collection, source in selected_papers(collections) if source == name
+            for c in store.paper_chunks(collection, source)
+        ]
+        end = len(chunks) if limit is None else offset + limit
+        return {
+            "text": "\n\n".join(c["text"] for c in chunks[offset:end]),
+            "offset": offset,
+            "limit": limit,
+            "total": len(chunks),
+            "next_offset": end if end < len(chunks) else None,
+        }
+
+    return conditional_json(request, build)
@@ -0,0 +1,59 @@
+"""
+Compare two bench.run result files:
+
+    python -m bench.compare before.json after.json
+
+Prints every numeric metric present in both runs with its relative
+change. Latencies (…_ms, …_s) are better when lower, rates (…_per_s,
+…_rps) when higher; changes beyond --threshold are flagged.
+"""
+import argparse
+import json
+
+
+def _flatten(tree, prefix=""):
+    for key, value in tree.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            yield from _flatten(value, path)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield path, value
+
+
+def _higher_is_better(path: str) -> bool:
+    leaf = path.rsplit(".", 1)[-1]
+    return leaf.endswith(("_per_s", "_rps"))
+
+
+def compare(before: dict, after: dict, threshold: float = 0.1) -> list:
+    """Rows of (metric, before, after, relative change, flag)."""
+    old = dict(_flatten(before["scenarios"]))
+    new = dict(_flatten(after["scenarios"]))
+
+    rows = []
+    for path in sorted(old.keys() & new.keys()):
+        a, b = old[path], new[path]
+        change = (b - a) / a if a else 0.0
+        better = change > 0 if _higher_is_better(path) else change < 0
+        flag = ""
+        if abs(change) >= threshold:
+            flag = "better" if better else "WORSE"
+        rows.append((path, a, b, change, flag))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark runs")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change to flag (default: %(default)s)")
+    args = parser.parse_args()
+
+    with open(args.before, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)
+
+    print(f"before: {before['meta'].get('commit')}  after: {after['meta'].get('commit')}")
+    for path, a, b, change, flag in compare(before, after, args.threshold):
+        print(f"{path:60s} {a:>12g} {b:>12g} {change:+8.1%} {flag}")
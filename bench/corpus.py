@@ -0,0 +1,118 @@
+"""
+Synthetic papers for benchmarks.
+
+Each paper is written around one topic with its own vocabulary, so hashed
+pseudo-embeddings (bench.ollama_stub) retrieve the right paper for a
+question built from that topic's words. PDFs are written directly (one
+Helvetica text stream per page), with no PDF library needed:
+
+    python -m bench.corpus out/papers --papers 20 --pages 8
+"""
+import argparse
+import os
+
+import numpy as np
+
+
+_COMMON = (
+    "the of and to in we a is for that this with on are by as our an be "
+    "results method model data paper show using which from approach"
+).split()
+
+
+def topic_vocabulary(topic: int, size: int = 60) -> list:
+    rng = np.random.default_rng(10_000 + topic)
+    syllables = ["ka", "lo", "mi", "ne", "ru", "sa", "to", "vi", "ze", "po", "du", "fa"]
+    return [
+        "".join(rng.choice(syllables, size=rng.integers(2, 4)))
+        + str(topic)
+        for _ in range(size)
+    ]
+
+
+def synthetic_text(rng, vocabulary: list, n_words: int) -> str:
+    """Mix of topic words and common filler, roughly 1:2."""
+    topic_words = rng.choice(vocabulary, size=n_words)
+    common_words = rng.choice(_COMMON, size=n_words)
+    use_topic = rng.random(n_words) < 0.35
+    words = np.where(use_topic, topic_words, common_words)
+    return " ".join(words) + "."
+
+
+def make_pdf(pages: list) -> bytes:
+    """Minimal PDF with one page per string (ASCII text)."""
+    out = [b"%PDF-1.4\n"]
+    offsets = {}
+
+    def obj(num: int, body: bytes):
+        offsets[num] = sum(len(x) for x in out)
+        out.append(f"{num} 0 obj\n".encode() + body + b"\nendobj\n")
+
+    page_nums = [4 + 2 * i for i in range(len(pages))]
+    kids = " ".join(f"{p} 0 R" for p in page_nums)
+    obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+    obj(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode())
+    obj(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    for num, text in zip(page_nums, pages):
+        text = text.replace("\\", "").replace("(", "").replace(")", "")
+        lines = [text[i:i + 90] for i in range(0, len(text), 90)]
+        stream = "BT /F1 9 Tf 36 806 Td 11 TL " + " ".join(f"({line}) Tj T*" for line in lines) + " ET"
+        obj(num, (
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {num + 1} 0 R >>"
+        ).encode())
+        obj(num + 1, f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream".encode())
+
+    xref_at = sum(len(x) for x in out)
+    total = 4 + 2 * len(pages)
+    xref = [f"xref\n0 {total}\n0000000000 65535 f \n"]
+    xref += [f"{offsets[k]:010d} 00000 n \n" for k in range(1, total)]
+    out.append("".join(xref).encode())
+    out.append(f"trailer\n<< /Size {total} /Root 1 0 R >>\nstartxref\n{xref_at}\n%%EOF\n".encode())
+    return b"".join(out)
+
+
+def write_corpus(
+    out_dir: str,
+    papers: int = 20,
+    pages: int = 8,
+    words_per_page: int = 400,
+    seed: int = 0,
+) -> list:
+    """Write `papers` PDFs to `out_dir`; returns their file names."""
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    names = []
+    for p in range(papers):
+        vocabulary = topic_vocabulary(p)
+        texts = [synthetic_text(rng, vocabulary, words_per_page) for _ in range(pages)]
+        name = f"synthetic_{p:04d}.pdf"
+        with open(os.path.join(out_dir, name), "wb") as f:
+            f.write(make_pdf(texts))
+        names.append(name)
+    return names
+
+
+def synthetic_questions(papers: int, n: int, seed: int = 1) -> list:
+    """Questions built from random papers' vocabularies (fact and explanation)."""
+    rng = np.random.default_rng(seed)
+    questions = []
+    for i in range(n):
+        words = " ".join(rng.choice(topic_vocabulary(int(rng.integers(papers))), size=4))
+        questions.append(f"explain how {words} works" if i % 3 == 2 else f"what is {words}")
+    return questions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic PDF corpus")
+    parser.add_argument("out_dir")
+    parser.add_argument("--papers", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=8)
+    parser.add_argument("--words-per-page", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    names = write_corpus(args.out_dir, args.papers, args.pages, args.words_per_page, args.seed)
+    print(f"Wrote {len(names)} PDFs to {args.out_dir}")
@@ -0,0 +1,176 @@
+"""
+Deterministic local stand-in for the Ollama APIs the app uses:
+
+- POST /api/embeddings  {"prompt": str}        -> {"embedding": [...]}
+- POST /api/embed       {"input": [str, ...]}  -> {"embeddings": [[...], ...]}
+- POST /api/generate    {"prompt": str, ...}   -> {"response": str, eval counts/durations}
+
+Embeddings are hashed bag-of-words vectors: every word maps to a fixed
+pseudo-random unit vector (seeded by its hash) and a text is the
+normalized sum of its words, so texts sharing words are similar and the
+same text always gets the same vector. Latency is simulated with sleeps:
+
+    python -m bench.ollama_stub --port 11435 --generate-ms 200 --token-ms 5
+    OLLAMA_BASE=http://localhost:11435 uvicorn api.app:app
+"""
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+DIM = 768
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+@lru_cache(maxsize=100_000)
+def _word_vector(word: str) -> np.ndarray:
+    seed = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+    return np.random.default_rng(seed).standard_normal(DIM).astype("float32")
+
+
+def pseudo_embedding(text: str) -> np.ndarray:
+    words = _WORD_RE.findall(text.lower())
+    if not words:
+        words = ["<empty>"]
+    vector = np.sum([_word_vector(w) for w in words], axis=0)
+    return vector / np.linalg.norm(vector)
+
+
+class StubConfig:
+    """
+    Args:
+        embed_ms (float): Latency per embedding request
+        embed_item_ms (float): Extra latency per text in a batch request
+        generate_ms (float): Fixed latency per generation (prompt eval)
+        token_ms (float): Latency per generated token
+        answer_tokens (int): Tokens generated, capped by num_predict
+    """
+
+    def __init__(
+        self,
+        embed_ms: float = 0.0,
+        embed_item_ms: float = 0.0,
+        generate_ms: float = 0.0,
+        token_ms: float = 0.0,
+        answer_tokens: int = 64,
+    ):
+        self.embed_ms = embed_ms
+        self.embed_item_ms = embed_item_ms
+        self.generate_ms = generate_ms
+        self.token_ms = token_ms
+        self.answer_tokens = answer_tokens
+
+
+def _sleep_ms(ms: float):
+    if ms > 0:
+        time.sleep(ms / 1000)
+
+
+def _generate(body: dict, config: StubConfig) -> dict:
+    prompt = body.get("prompt", "")
+    num_predict = body.get("options", {}).get("num_predict", config.answer_tokens)
+    eval_count = max(1, min(config.answer_tokens, int(num_predict)))
+
+    prompt_ms = config.generate_ms
+    eval_ms = eval_count * config.token_ms
+    _sleep_ms(prompt_ms + eval_ms)
+
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    return {
+        "model": body.get("model", ""),
+        "response": f"Stub answer {digest[:12]} ({eval_count} tokens).",
+        "done": True,
+        "prompt_eval_count": (len(prompt) + 3) // 4,
+        "eval_count": eval_count,
+        "prompt_eval_duration": int(prompt_ms * 1e6),
+        "eval_duration": int(eval_ms * 1e6),
+        "total_duration": int((prompt_ms + eval_ms) * 1e6),
+    }
+
+
+def _handler(config: StubConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status: int, payload):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path in ("/", "/api/version"):
+                self._reply(200, {"version": "stub"})
+            elif self.path == "/api/tags":
+                self._reply(200, {"models": []})
+            else:
+                self._reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+
+            if self.path == "/api/embeddings":
+                _sleep_ms(config.embed_ms + config.embed_item_ms)
+                vector = pseudo_embedding(body.get("prompt", ""))
+                self._reply(200, {"embedding": vector.tolist()})
+            elif self.path == "/api/embed":
+                texts = body.get("input", [])
+                texts = [texts] if isinstance(texts, str) else texts
+                _sleep_ms(config.embed_ms + config.embed_item_ms * len(texts))
+                vectors = [pseudo_embedding(t).tolist() for t in texts]
+                self._reply(200, {"embeddings": vectors})
+            elif self.path == "/api/generate":
+                self._reply(200, _generate(body, config))
+            else:
+                self._reply(404, {"error": "not found"})
+
+    return Handler
+
+
+def start_stub(port: int = 0, config: StubConfig = None) -> ThreadingHTTPServer:
+    """
+    Serve the stub from a background thread. Port 0 picks a free port;
+    the server's base URL is f"http://127.0.0.1:{server.server_port}".
+    Call server.shutdown() to stop it.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), _handler(config or StubConfig()))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Deterministic Ollama stand-in")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--embed-ms", type=float, default=0.0, help="latency per embed request")
+    parser.add_argument("--embed-item-ms", type=float, default=0.0, help="extra latency per embedded text")
+    parser.add_argument("--generate-ms", type=float, default=0.0, help="fixed latency per generation")
+    parser.add_argument("--token-ms", type=float, default=0.0, help="latency per generated token")
+    parser.add_argument("--answer-tokens", type=int, default=64, help="tokens per answer (capped by num_predict)")
+    args = parser.parse_args()
+
+    server = start_stub(args.port, StubConfig(
+        embed_ms=args.embed_ms,
+        embed_item_ms=args.embed_item_ms,
+        generate_ms=args.generate_ms,
+        token_ms=args.token_ms,
+        answer_tokens=args.answer_tokens,
+    ))
+    print(f"Ollama stub on http://127.0.0.1:{server.server_port} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
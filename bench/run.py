@@ -0,0 +1,381 @@
+"""
+Benchmark scenarios, run against the Ollama stand-in (bench.ollama_stub)
+so results do not depend on a GPU or a live model:
+
+- ingest: synthetic PDFs through rag.ingest_pipeline (chunks/s, files/s)
+- search: FAISS search and MMR latency over 10k–1M clustered vectors, with
+          index bytes per vector and, for two-stage storage (--storage
+          sq8/fp16/prefix), recall@k against exact full-dimension search
+- ask:    /ask latency percentiles under concurrent load, served by
+          uvicorn on a corpus ingested with rag.ingest_index
+
+    python -m bench.run --out results.json
+    python -m bench.run --scenarios search --sizes 10000 100000 1000000
+    python -m bench.compare before.json after.json
+
+Results are JSON with the commit, machine and configuration, so runs of
+different commits on the same machine can be compared.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from bench.corpus import synthetic_questions, write_corpus
+from bench.ollama_stub import DIM, StubConfig, start_stub
+
+
+SCENARIOS = ("ingest", "search", "ask")
+
+
+def _percentiles(values_ms) -> dict:
+    values = np.asarray(values_ms, dtype="float64")
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p90_ms": round(float(np.percentile(values, 90)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "mean_ms": round(float(values.mean()), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _metadata() -> dict:
+    import faiss
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = None, None
+
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "faiss": faiss.__version__,
+    }
+
+
+# -----------------------------
+# Ingest
+# -----------------------------
+def bench_ingest(workdir: str, papers: int, pages: int, embed_batch: int, embed_workers: int) -> dict:
+    from rag.ingest_pipeline import IngestPipeline
+    from rag.manifest import file_entry
+    from rag.vectorstore import FaissVectorStore
+
+    pdf_dir = os.path.join(workdir, "ingest_papers")
+    names = write_corpus(pdf_dir, papers=papers, pages=pages)
+    entries = {name: file_entry(os.path.join(pdf_dir, name)) for name in names}
+
+    store = FaissVectorStore(DIM)
+    pipeline = IngestPipeline(
+        store, pdf_dir, entries,
+        on_checkpoint=lambda completed: None,
+        embed_batch=embed_batch,
+        embed_workers=embed_workers,
+        progress=False,
+    )
+
+    t0 = time.perf_counter()
+    pipeline.run(names)
+    seconds = time.perf_counter() - t0
+
+    chunks = store.index.ntotal
+    return {
+        "files": len(names),
+        "chunks": chunks,
+        "seconds": round(seconds, 3),
+        "chunks_per_s": round(chunks / seconds, 1),
+        "files_per_s": round(len(names) / seconds, 2),
+    }
+
+
+# -----------------------------
+# Search
+# -----------------------------
+def _clustered_batches(n: int, batch: int = 100_000, clusters: int = 200, seed: int = 0):
+    """Clustered unit vectors in batches, so 1M x 768 never exists twice."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, DIM)).astype("float32")
+    for start in range(0, n, batch):
+        size = min(batch, n - start)
+        vectors = centers[rng.integers(0, clusters, size)]
+        vectors += 0.6 * rng.standard_normal((size, DIM)).astype("float32")
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        yield vectors
+
+
+def _exact_top_k(vectors, queries, k: int, block: int = 100_000) -> np.ndarray:
+    """Ids of the exact top-k rows per query, scanning `vectors` in blocks."""
+    cand_scores, cand_ids = [], []
+    for start in range(0, len(vectors), block):
+        scores = queries @ np.asarray(vectors[start:start + block]).T
+        kk = min(k, scores.shape[1])
+        top = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+        cand_scores.append(np.take_along_axis(scores, top, axis=1))
+        cand_ids.append(top + start)
+
+    order = np.argsort(-np.hstack(cand_scores), axis=1)[:, :k]
+    return np.take_along_axis(np.hstack(cand_ids), order, axis=1)
+
+
+def bench_search(workdir: str, n: int, queries: int, storage: str, top_k: int = 3, fetch_k: int = 10,
+                 prefix_dims: int = 256) -> dict:
+    from rag.vectorstore import FaissVectorStore
+
+    store = FaissVectorStore(
+        DIM, storage=storage,
+        vectors_path=os.path.join(workdir, f"bench_{storage}_{n}.f32"),
+        prefix_dims=prefix_dims,
+    )
+
+    t0 = time.perf_counter()
+    sample = []
+    for vectors in _clustered_batches(n):
+        offset = store.index.ntotal
+        metas = [{"text": "", "source": f"p{(offset + i) // 1000}", "page": 1} for i in range(len(vectors))]
+        store.add_batch(vectors, metas, copy=False)
+        sample.append(vectors[:max(1, queries // 10)])
+    build_s = time.perf_counter() - t0
+
+    # Queries near indexed vectors, like real questions about the corpus
+    rng = np.random.default_rng(1)
+    pool = np.vstack(sample)
+    qs = pool[rng.integers(0, len(pool), queries)] + 0.3 * rng.standard_normal((queries, DIM)).astype("float32")
+    qs /= np.linalg.norm(qs, axis=1, keepdims=True)
+
+    for q in qs[:5]:
+        store.search_mmr(q, top_k=top_k, fetch_k=fetch_k)
+
+    def timed(fn):
+        out = []
+        for q in qs:
+            t = time.perf_counter()
+            fn(q)
+            out.append(1000 * (time.perf_counter() - t))
+        return _percentiles(out)
+
+    search = timed(lambda q: store.search(q, top_k=top_k))
+    mmr = timed(lambda q: store.search_mmr(q, top_k=top_k, fetch_k=fetch_k))
+
+    t = time.perf_counter()
+    store.search_mmr_batch(qs, top_k=top_k, fetch_k=fetch_k)
+    batch_ms = 1000 * (time.perf_counter() - t) / len(qs)
+
+    snap = store.snapshot()
+    result = {
+        "vectors": n,
+        "storage": storage,
+        "build_s": round(build_s, 3),
+        "index_bytes_per_vector": snap.index.code_size,
+        "search": search,
+        "search_mmr": mmr,
+        "search_mmr_batch_per_query_ms": round(batch_ms, 3),
+    }
+    if storage == "prefix":
+        result["prefix_dims"] = store.prefix_dims
+    if snap.vectors is not None:
+        truth = _exact_top_k(snap.vectors, qs, top_k)
+        found = [[h["id"] for h in store.search(q, top_k=top_k)] for q in qs]
+        hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth.tolist()))
+        result["recall_at_k"] = round(hits / truth.size, 4)
+    return result
+
+
+# -----------------------------
+# /ask
+# -----------------------------
+def _wait_ready(url: str, timeout: float = 300.0):
+    """Poll the readiness probe: /ask answers 503 until indexes are loaded."""
+    import requests
+
+    deadline = time.monotonic() + timeout
+    while True:
+        r = requests.get(url, timeout=10)
+        if r.status_code == 200:
+            return
+        if r.json().get("status") == "failed":
+            raise RuntimeError(f"API failed to load its indexes: {r.json().get('error')}")
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"API not ready after {timeout:.0f}s: {r.json()}")
+        time.sleep(0.1)
+
+
+def bench_ask(workdir: str, papers: int, pages: int, requests_n: int, concurrency: int) -> dict:
+    import requests
+    import uvicorn
+
+    # A stand-in's pseudo-embeddings are not calibrated like nomic's:
+    # disable the gate so every request runs the full path.
+    os.environ["RAG_MIN_RELEVANCE"] = "0"
+
+    root = os.path.join(workdir, "ask")
+    write_corpus(os.path.join(root, "data", "papers"), papers=papers, pages=pages, seed=7)
+
+    cwd = os.getcwd()
+    os.chdir(root)
+    server = None
+    try:
+        from rag import ingest_index
+
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            ingest_index.main()
+
+        from api.app import app
+
+        port = _free_port()
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        threading.Thread(target=server.run, daemon=True).start()
+        while not server.started:
+            time.sleep(0.05)
+        _wait_ready(f"http://127.0.0.1:{port}/readyz")
+
+        url = f"http://127.0.0.1:{port}/ask"
+        questions = synthetic_questions(papers, requests_n)
+        session = threading.local()
+
+        def ask(i):
+            if not hasattr(session, "s"):
+                session.s = requests.Session()
+            t = time.perf_counter()
+            r = session.s.post(url, json={
+                "question": questions[i], "session_id": f"bench-{i}", "timings": True,
+            }, timeout=300)
+            ms = 1000 * (time.perf_counter() - t)
+            return ms, r.status_code, (r.json() if r.ok else {})
+
+        ask(0)  # warm up
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(ask, range(requests_n)))
+        wall = time.perf_counter() - t0
+    finally:
+        if server is not None:
+            server.should_exit = True
+        os.chdir(cwd)
+
+    ok = [r for r in results if r[1] == 200]
+    stages = {}
+    for _, _, body in ok:
+        for name, ms in (body.get("timings") or {}).items():
+            stages.setdefault(name, []).append(ms)
+
+    return {
+        "requests": requests_n,
+        "concurrency": concurrency,
+        "errors": len(results) - len(ok),
+        "throughput_rps": round(len(results) / wall, 2),
+        "latency": _percentiles([r[0] for r in results]),
+        "server_stages_p50_ms": {
+            name: round(float(np.percentile(v, 50)), 3) for name, v in sorted(stages.items())
+        },
+    }
+
+
+# -----------------------------
+# Main
+# -----------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run RAG benchmarks")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--out", help="write JSON results here (default: stdout)")
+    parser.add_argument("--ollama-url", help="benchmark a real Ollama instead of the stand-in")
+    stub = parser.add_argument_group("stand-in latency")
+    stub.add_argument("--embed-ms", type=float, default=5.0)
+    stub.add_argument("--embed-item-ms", type=float, default=1.0)
+    stub.add_argument("--generate-ms", type=float, default=50.0)
+    stub.add_argument("--token-ms", type=float, default=2.0)
+    ingest = parser.add_argument_group("ingest")
+    ingest.add_argument("--papers", type=int, default=20)
+    ingest.add_argument("--pages", type=int, default=8)
+    ingest.add_argument("--embed-batch", type=int, default=32)
+    ingest.add_argument("--embed-workers", type=int, default=2)
+    search = parser.add_argument_group("search")
+    search.add_argument("--sizes", nargs="+", type=int, default=[10_000, 100_000])
+    search.add_argument("--queries", type=int, default=200)
+    search.add_argument("--storage", default="flat", help="flat, sq8, fp16 or prefix")
+    search.add_argument("--prefix-dims", type=int, default=256)
+    ask = parser.add_argument_group("ask")
+    ask.add_argument("--requests", type=int, default=200)
+    ask.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    config = {k: v for k, v in vars(args).items() if k not in ("out", "scenarios")}
+
+    stub_server = None
+    if args.ollama_url:
+        base = args.ollama_url
+    else:
+        stub_server = start_stub(config=StubConfig(
+            embed_ms=args.embed_ms,
+            embed_item_ms=args.embed_item_ms,
+            generate_ms=args.generate_ms,
+            token_ms=args.token_ms,
+        ))
+        base = f"http://127.0.0.1:{stub_server.server_port}"
+
+    # Read by ingest.embed and rag.generator at import time
+    os.environ["OLLAMA_BASE"] = base
+
+    results = {"meta": _metadata(), "config": config, "scenarios": {}}
+    with tempfile.TemporaryDirectory(prefix="rag-bench-") as workdir:
+        if "ingest" in args.scenarios:
+            print("ingest...", file=sys.stderr)
+            results["scenarios"]["ingest"] = bench_ingest(
+                workdir, args.papers, args.pages, args.embed_batch, args.embed_workers
+            )
+        if "search" in args.scenarios:
+            results["scenarios"]["search"] = {}
+            for n in args.sizes:
+                print(f"search {n}...", file=sys.stderr)
+                results["scenarios"]["search"][str(n)] = bench_search(
+                    workdir, n, args.queries, args.storage, prefix_dims=args.prefix_dims
+                )
+        if "ask" in args.scenarios:
+            print("ask...", file=sys.stderr)
+            results["scenarios"]["ask"] = bench_ask(
+                workdir, args.papers, args.pages, args.requests, args.concurrency
+            )
+
+    if stub_server is not None:
+        stub_server.shutdown()
+
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,46 @@
+import os
 import requests
 import numpy as np
 
-OLLAMA_EMBED_URL = "http://localhost:11434/api/embeddings"
+OLLAMA_BASE = os.getenv("OLLAMA_BASE", "http://localhost:11434")
+OLLAMA_EMBED_URL = OLLAMA_BASE.rstrip("/") + "/api/embeddings"
+OLLAMA_EMBED_BATCH_URL = OLLAMA_BASE.rstrip("/") + "/api/embed"
 EMBED_MODEL = "nomic-embed-text"
 
 
-def get_embedding(text: str) -> np.ndarray:
+def get_embedding(text: str, timeout: float = None) -> np.ndarray:
     response = requests.post(
         OLLAMA_EMBED_URL,
         json={
             "model": EMBED_MODEL,
             "prompt": text
-        }
+        },
+        timeout=timeout
     )
     response.raise_for_status()
     return np.array(response.json()["embedding"])
 
 
+def get_embeddings(texts: list, batch_size: int = 64) -> np.ndarray:
+    """
+    Embed many texts with Ollama's batched /api/embed endpoint, one request
+    per `batch_size` texts. Returns an (n, dim) array in input order.
+    """
+    batches = []
+    for start in range(0, len(texts), batch_size):
+        response = requests.post(
+            OLLAMA_EMBED_BATCH_URL,
+            json={
+                "model": EMBED_MODEL,
+                "input": texts[start:start + batch_size]
+            }
+        )
+        response.raise_for_status()
+        batches.append(np.array(response.json()["embeddings"]))
+
+    return np.vstack(batches)
+
+
 if __name__ == "__main__":
     test_text = "Transformers use self-attention to model long-range dependencies."
     emb = get_embedding(test_text)
@@ -2,20 +2,32 @@ from pathlib import Path
 from pypdf import PdfReader
 
 
-def load_pdfs(pdf_dir="data/papers"):
+def load_pdf(pdf_path):
+    """
+    Extract the non-empty pages of a single PDF as documents with
+    "source" (file name), "page" (1-based) and "text".
+    """
+    pdf_path = Path(pdf_path)
+    reader = PdfReader(pdf_path)
     documents = []
 
-    for pdf_path in Path(pdf_dir).glob("*.pdf"):
-        reader = PdfReader(pdf_path)
+    for page_num, page in enumerate(reader.pages):
+        text = page.extract_text()
+
+        if text and text.strip():
+            documents.append({
+                "source": pdf_path.name,
+                "page": page_num + 1,
+                "text": text
+            })
+
+    return documents
 
-        for page_num, page in enumerate(reader.pages):
-            text = page.extract_text()
 
-            if text and text.strip():
-                documents.append({
-                    "source": pdf_path.name,
-                    "page": page_num + 1,
-                    "text": text
-                })
+def load_pdfs(pdf_dir="data/papers"):
+    documents = []
+
+    for pdf_path in Path(pdf_dir).glob("*.pdf"):
+        documents.extend(load_pdf(pdf_path))
 
     return documents
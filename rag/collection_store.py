@@ -0,0 +1,407 @@
+"""
+Named collections, each with its own FAISS shard and chunk store.
+
+The "default" collection keeps the original layout (rag/index/*,
+data/papers/*); every other collection lives in its own directory:
+
+    rag/index/collections/<name>/{faiss.index, metadata.pkl, vectors.f32, manifest.json}
+    data/collections/<name>/*.pdf
+
+Queries fan out over the selected shards in a thread pool (FAISS releases
+the GIL while searching) and the per-shard top-k lists are merged with a heap.
+
+rag.vectorstore (and with it faiss) is imported on first use, so importing
+this module for its paths and names stays cheap.
+"""
+import hashlib
+import heapq
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+
+import numpy as np
+
+
+INDEX_DIR = "rag/index"
+PAPERS_DIR = "data/papers"
+COLLECTIONS_INDEX_DIR = os.path.join(INDEX_DIR, "collections")
+COLLECTIONS_PAPERS_DIR = os.path.join("data", "collections")
+
+DEFAULT_COLLECTION = "default"
+DIM = 768
+
+# "flat" (exact float32), "sq8", "fp16" or "prefix" — see rag.vectorstore.STORAGE_MODES
+VECTOR_STORAGE = os.getenv("RAG_VECTOR_STORAGE", "flat")
+
+# First-stage dimensions of "prefix" storage
+PREFIX_DIMS = int(os.getenv("RAG_PREFIX_DIMS", "256"))
+
+_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+
+def validate_name(name: str) -> str:
+    """
+    Collection names become directory names, so keep them to a safe set.
+    Raises ValueError otherwise.
+    """
+    if not _NAME_RE.match(name or ""):
+        raise ValueError(
+            f"Invalid collection name {name!r}: use letters, digits, '-' and '_' (max 64)"
+        )
+    return name
+
+
+def index_dir(name: str) -> str:
+    if name == DEFAULT_COLLECTION:
+        return INDEX_DIR
+    return os.path.join(COLLECTIONS_INDEX_DIR, validate_name(name))
+
+
+def papers_dir(name: str) -> str:
+    if name == DEFAULT_COLLECTION:
+        return PAPERS_DIR
+    return os.path.join(COLLECTIONS_PAPERS_DIR, validate_name(name))
+
+
+def index_paths(name: str):
+    """Return (faiss_path, meta_path, vectors_path) for a collection."""
+    d = index_dir(name)
+    return (
+        os.path.join(d, "faiss.index"),
+        os.path.join(d, "metadata.pkl"),
+        os.path.join(d, "vectors.f32"),
+    )
+
+
+def manifest_path(name: str) -> str:
+    """Manifest of indexed papers, see rag.manifest."""
+    return os.path.join(index_dir(name), "manifest.json")
+
+
+def summaries_path(name: str) -> str:
+    """Precomputed per-paper summaries, see rag.summaries."""
+    return os.path.join(index_dir(name), "summaries.json")
+
+
+def new_store(name: str, storage: str = None, prefix_dims: int = None) -> "FaissVectorStore":
+    """Create an empty store wired to a collection's side-file path."""
+    from rag.vectorstore import FaissVectorStore
+
+    os.makedirs(index_dir(name), exist_ok=True)
+    _, _, vectors_path = index_paths(name)
+    return FaissVectorStore(
+        dim=DIM,
+        storage=storage or VECTOR_STORAGE,
+        vectors_path=vectors_path,
+        prefix_dims=prefix_dims or PREFIX_DIMS,
+    )
+
+
+def load_store(name: str) -> "FaissVectorStore":
+    """Load a saved shard; storage mode and prefix dims follow the file."""
+    from rag.vectorstore import FaissVectorStore
+
+    faiss_path, meta_path, vectors_path = index_paths(name)
+
+    store = FaissVectorStore(dim=DIM, vectors_path=vectors_path)
+    store.load(faiss_path, meta_path)
+    return store
+
+
+def save_store(name: str, store: "FaissVectorStore"):
+    faiss_path, meta_path, _ = index_paths(name)
+    store.save(faiss_path, meta_path)
+
+
+def _saved_state(name: str):
+    """
+    Identity of a collection's last committed save (its metadata record,
+    renamed into place by every save), or None if it was never saved.
+    """
+    try:
+        st = os.stat(index_paths(name)[1])
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def saved_collections() -> list:
+    """Names of collections with an index on disk."""
+    names = []
+    if os.path.exists(index_paths(DEFAULT_COLLECTION)[0]):
+        names.append(DEFAULT_COLLECTION)
+
+    if os.path.isdir(COLLECTIONS_INDEX_DIR):
+        for entry in sorted(os.listdir(COLLECTIONS_INDEX_DIR)):
+            if _NAME_RE.match(entry) and os.path.exists(index_paths(entry)[0]):
+                names.append(entry)
+
+    return names
+
+
+class CollectionStore:
+    """
+    A set of named FaissVectorStore shards searched as one.
+
+    The shard map is copy-on-write like the shards themselves: creating a
+    collection publishes a new dict, so readers never lock.
+
+    Other processes (`rag.ingest_index`) may rewrite a collection on disk;
+    `changed_on_disk` tells when that happened since this process last
+    loaded or saved it, and `reload` picks up their version.
+    """
+
+    def __init__(self, shards: dict = None, max_workers: int = None):
+        self.shards = dict(shards or {})
+        # Bumped whenever the shard map changes (see version)
+        self._generation = 0
+        # _saved_state of each shard as last loaded or saved here
+        self._saved = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers or min(8, os.cpu_count() or 1),
+            thread_name_prefix="shard-search",
+        )
+
+    @classmethod
+    def load_all(cls, max_workers: int = None) -> "CollectionStore":
+        collections = cls(max_workers=max_workers)
+        for name in saved_collections():
+            collections.reload(name)
+        return collections
+
+    # -----------------------------
+    # Collections
+    # -----------------------------
+    def names(self) -> list:
+        return sorted(self.shards)
+
+    def shard(self, name: str) -> "FaissVectorStore":
+        try:
+            return self.shards[name]
+        except KeyError:
+            raise KeyError(f"Unknown collection {name!r}") from None
+
+    def get_or_create(self, name: str) -> "FaissVectorStore":
+        validate_name(name)
+        store = self.shards.get(name)
+        if store is not None:
+            return store
+
+        with self._lock:
+            store = self.shards.get(name)
+            if store is None:
+                store = new_store(name)
+                self.shards = {**self.shards, name: store}
+                self._generation += 1
+        return store
+
+    def reload(self, name: str) -> "FaissVectorStore":
+        """
+        Load a collection's shard from disk again and swap it in, e.g.
+        after `rag.ingest_index --full` rebuilt it. Searches in flight
+        finish on the old shard.
+        """
+        validate_name(name)
+        # Taken first: a save racing the load only causes another reload
+        saved = _saved_state(name)
+        store = load_store(name)
+        with self._lock:
+            self.shards = {**self.shards, name: store}
+            self._saved[name] = saved
+            self._generation += 1
+        return store
+
+    def changed_on_disk(self, name: str) -> bool:
+        """True if another process saved the collection since this one loaded or saved it."""
+        return _saved_state(name) != self._saved.get(name)
+
+    def version(self) -> str:
+        """
+        Short tag that changes whenever any shard publishes a snapshot or a
+        collection is created or reloaded. Only comparable within a process.
+        """
+        state = [self._generation] + [(n, s.version) for n, s in sorted(self.shards.items())]
+        return hashlib.sha1(repr(state).encode()).hexdigest()[:12]
+
+    def _selected(self, names=None) -> list:
+        shards = self.shards
+        if not names:
+            return sorted(shards.items())
+        missing = [n for n in names if n not in shards]
+        if missing:
+            raise KeyError(f"Unknown collection(s): {', '.join(missing)}")
+        return [(n, shards[n]) for n in dict.fromkeys(names)]
+
+    # -----------------------------
+    # Writes
+    # -----------------------------
+    def save(self, name: str):
+        save_store(name, self.shard(name))
+        self._saved[name] = _saved_state(name)
+
+    # -----------------------------
+    # Reads
+    # -----------------------------
+    def iter_metadata(self, names=None):
+        """Chunk metadata of the selected collections, in collection order."""
+        return chain.from_iterable(
+            store.metadata for _, store in self._selected(names)
+        )
+
+    def papers(self, names=None) -> list:
+        """(collection, source) for every paper in the selected collections."""
+        return [
+            (name, source)
+            for name, store in self._selected(names)
+            for source in sorted(store.snapshot().paper_ranges)
+        ]
+
+    def paper_stats(self, names=None) -> list:
+        """Chunk, page and character counts of every paper, from the snapshot columns."""
+        stats = []
+        for name, store in self._selected(names):
+            snap = store.snapshot()
+            for source, runs in sorted(snap.paper_ranges.items()):
+                ids = np.concatenate([np.arange(a, b) for a, b in runs])
+                uploaded = snap.uploaded_at[ids]
+                stats.append({
+                    "collection": name,
+                    "source": source,
+                    "chunks": len(ids),
+                    "pages": int(snap.pages[ids].max()),
+                    "chars": sum(len(snap.metadata[i]["text"]) for i in ids),
+                    "uploaded_at": None if np.isnan(uploaded).all() else float(np.nanmax(uploaded)),
+                })
+        return stats
+
+    def paper_chunks(self, name: str, source: str) -> list:
+        """Chunks of one paper in a collection, in document order."""
+        snap = self.shard(name).snapshot()
+        return [
+            snap.metadata[i]
+            for start, end in snap.paper_ranges.get(source, ())
+            for i in range(start, end)
+        ]
+
+    def paper_vectors(self, name: str, source: str):
+        """(chunks, exact vectors) of one paper in a collection."""
+        return self.shard(name).paper_vectors(source)
+
+    def chunk(self, name: str, chunk_id: int):
+        """Metadata of row `chunk_id` in a collection, or None if out of range."""
+        store = self.shards.get(name)
+        if store is None:
+            return None
+        metadata = store.metadata
+        return metadata[chunk_id] if 0 <= chunk_id < len(metadata) else None
+
+    def count(self, filters: dict = None) -> int:
+        names, filters = _split_filters(filters)
+        return sum(store.count(filters) for _, store in self._selected(names))
+
+    def warmup(self) -> int:
+        """Warm every shard (FaissVectorStore.warmup); returns rows touched."""
+        return sum(store.warmup() for _, store in self._selected())
+
+    def stats(self) -> list:
+        return [
+            {
+                "name": name,
+                "chunks": len(store.metadata),
+                "papers": len(store.snapshot().paper_ranges),
+                "storage": store.storage,
+            }
+            for name, store in self._selected()
+        ]
+
+    def _fan_out(self, fn, names):
+        """
+        Run fn(name, store) on each selected shard and return the results.
+        A single shard is searched inline to skip the pool round-trip.
+        """
+        selected = self._selected(names)
+        if len(selected) == 1:
+            return [fn(*selected[0])]
+        return list(self._pool.map(lambda item: fn(*item), selected))
+
+    def search(self, query_embedding, top_k=3, filters: dict = None):
+        names, filters = _split_filters(filters)
+
+        def one(name, store):
+            hits = store.search(query_embedding, top_k=top_k, filters=filters)
+            for h in hits:
+                h["collection"] = name
+            return hits
+
+        per_shard = self._fan_out(one, names)
+        return heapq.nlargest(top_k, chain.from_iterable(per_shard), key=lambda c: c["score"])
+
+    def mmr_candidates(self, query_embedding, fetch_k=10, filters: dict = None):
+        """
+        Global `fetch_k` shortlist over the selected shards, with exact
+        embeddings. `query_embedding` must already be normalized.
+        """
+        names, filters = _split_filters(filters)
+
+        def one(name, store):
+            candidates = store.mmr_candidates(query_embedding, fetch_k, filters)
+            for c in candidates:
+                c["collection"] = name
+            return candidates
+
+        per_shard = self._fan_out(one, names)
+        return heapq.nlargest(
+            fetch_k, chain.from_iterable(per_shard), key=lambda c: c["score"]
+        )
+
+    def search_mmr(self, query_embedding, top_k=3, fetch_k=10, lambda_mult=0.5,
+                   filters: dict = None):
+        # Global fetch_k shortlist first, then MMR over the merged set, so
+        # results match a single index holding every collection.
+        query_embedding = query_embedding / np.linalg.norm(query_embedding)
+        candidates = self.mmr_candidates(query_embedding, fetch_k, filters)
+        from rag.vectorstore import mmr_select
+
+        return mmr_select(query_embedding, candidates, top_k, lambda_mult)
+
+    def search_mmr_batch(self, query_embeddings, top_k=3, fetch_k=10, lambda_mult=0.5,
+                         filters: dict = None):
+        """
+        `search_mmr` for many queries: one matrix search per shard, merged
+        per query, then a vectorized MMR pass. One result list per query.
+        """
+        names, filters = _split_filters(filters)
+        queries = np.asarray(query_embeddings, dtype="float32")
+        queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+        def one(name, store):
+            per_query = store.mmr_candidates_batch(queries, fetch_k, filters)
+            for candidates in per_query:
+                for c in candidates:
+                    c["collection"] = name
+            return per_query
+
+        per_shard = self._fan_out(one, names)
+        if not per_shard:
+            return [[] for _ in queries]
+        merged = [
+            heapq.nlargest(fetch_k, chain.from_iterable(lists), key=lambda c: c["score"])
+            for lists in zip(*per_shard)
+        ]
+        from rag.vectorstore import mmr_select_batch
+
+        return mmr_select_batch(queries, merged, top_k, lambda_mult)
+
+
+def _split_filters(filters: dict):
+    """
+    Separate the shard selection ("collections") from the per-shard filters.
+    """
+    if not filters:
+        return None, None
+    filters = dict(filters)
+    names = filters.pop("collections", None)
+    return names, filters or None
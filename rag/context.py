@@ -0,0 +1,196 @@
+"""
+Context packing for generation.
+
+Retrieved chunks often overlap (chunk_text shares 100 characters between
+neighbours) or sit next to each other on the same page. The packer:
+
+- optionally pulls in each hit's neighbouring chunks on the same page,
+- merges chunks that are adjacent on a page into one passage, dropping the
+  overlapping text,
+- keeps passages by relevance until a token budget is used up,
+- writes each "[source | page N]" citation header once.
+"""
+import os
+from collections import defaultdict
+
+
+# Tokens of context (chunks + conversation) sent to the model. llama3.2
+# runs with a small default window in Ollama, and the prompt also holds
+# instructions, the question and room for the answer.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKENS", "1500"))
+
+# Neighbouring chunks (each side, same page) added around every hit
+CONTEXT_NEIGHBOURS = int(os.getenv("RAG_CONTEXT_NEIGHBOURS", "0"))
+
+# Passages are only cut to fit if at least this many tokens are left
+_MIN_PARTIAL_TOKENS = 64
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count (about 4 characters per token for English text);
+    good enough for budgeting without loading a tokenizer.
+    """
+    return (len(text) + 3) // 4
+
+
+def merge_text(a: str, b: str, max_overlap: int = 200) -> str:
+    """
+    Join two consecutive chunks, dropping the longest suffix of `a` that
+    `b` starts with (the chunker's overlap).
+    """
+    for n in range(min(max_overlap, len(a), len(b)), 0, -1):
+        if a.endswith(b[:n]):
+            return a + b[n:]
+    return a + b
+
+
+def _page_key(chunk):
+    return (chunk.get("collection"), chunk["source"], chunk["page"])
+
+
+def _header(key) -> str:
+    _, source, page = key
+    return f"[{source} | page {page}]"
+
+
+def _expand(hits, neighbours: int, lookup):
+    """
+    Add up to `neighbours` chunks on each side of every hit, from the same
+    page. `lookup(chunk, offset)` returns the chunk `offset` rows away or
+    None. Neighbours rank just below the hit that pulled them in.
+    """
+    by_id = {(c.get("collection"), c["id"]): c for c in hits if "id" in c}
+
+    for hit in list(hits):
+        if "id" not in hit:
+            continue
+        for d in range(1, neighbours + 1):
+            for offset in (-d, d):
+                key = (hit.get("collection"), hit["id"] + offset)
+                if key in by_id:
+                    continue
+                meta = lookup(hit, offset)
+                if meta is None:
+                    continue
+                if (meta["source"], meta["page"]) != (hit["source"], hit["page"]):
+                    continue
+                by_id[key] = {
+                    "id": key[1],
+                    "collection": hit.get("collection"),
+                    "source": meta["source"],
+                    "page": meta["page"],
+                    "text": meta["text"],
+                    "score": hit["score"] - 1e-6 * d,
+                    "neighbour": True,
+                }
+
+    return list(by_id.values()) + [c for c in hits if "id" not in c]
+
+
+def _passages(chunks):
+    """
+    Group chunks into passages: runs of consecutive ids on the same page
+    are merged into one text. Each passage keeps its best score and the
+    hits it contains.
+    """
+    pages = defaultdict(list)
+    for c in chunks:
+        pages[_page_key(c)].append(c)
+
+    passages = []
+    for key, members in pages.items():
+        members.sort(key=lambda c: c.get("id", -1))
+        run = [members[0]]
+
+        for c in members[1:]:
+            prev = run[-1]
+            if "id" in c and "id" in prev and c["id"] == prev["id"] + 1:
+                run.append(c)
+            else:
+                passages.append(_passage(key, run))
+                run = [c]
+        passages.append(_passage(key, run))
+
+    return passages
+
+
+def _passage(key, run):
+    text = run[0]["text"]
+    for c in run[1:]:
+        text = merge_text(text, c["text"])
+
+    return {
+        "key": key,
+        "text": text,
+        "score": max(c["score"] for c in run),
+        "hits": [c for c in run if not c.get("neighbour")],
+    }
+
+
+def pack_context(
+    chunks,
+    token_budget: int = None,
+    neighbours: int = None,
+    lookup=None,
+):
+    """
+    Build the context block for `chunks` (retrieved hits with "source",
+    "page", "text", "score" and, for merging, "id"/"collection").
+
+    Returns (context, used) where `used` are the hits that made it into
+    the context, best first — use them for the answer's sources.
+    """
+    budget = CONTEXT_TOKEN_BUDGET if token_budget is None else token_budget
+    neighbours = CONTEXT_NEIGHBOURS if neighbours is None else neighbours
+
+    if neighbours > 0 and lookup is not None:
+        chunks = _expand(chunks, neighbours, lookup)
+
+    passages = sorted(_passages(chunks), key=lambda p: -p["score"])
+
+    # Keep passages by relevance while they fit (headers count too)
+    kept, used_tokens, headed = [], 0, set()
+    for p in passages:
+        header = 0 if p["key"] in headed else estimate_tokens(_header(p["key"])) + 1
+        tokens = estimate_tokens(p["text"]) + header
+        remaining = budget - used_tokens
+
+        if tokens <= remaining:
+            kept.append(p)
+            headed.add(p["key"])
+            used_tokens += tokens
+        elif remaining - header >= _MIN_PARTIAL_TOKENS:
+            cut = (remaining - header - 1) * 4
+            kept.append({**p, "text": p["text"][:cut].rstrip() + " …"})
+            break
+        else:
+            break
+
+    # One header per page, pages in order of their best passage
+    blocks = {}
+    for p in kept:
+        blocks.setdefault(p["key"], []).append(p["text"])
+
+    context = "\n\n".join(
+        _header(key) + "\n" + "\n…\n".join(texts)
+        for key, texts in blocks.items()
+    )
+
+    used = sorted(
+        (hit for p in kept for hit in p["hits"]),
+        key=lambda c: -c["score"],
+    )
+    return context, used
+
+
+def trim_conversation(lines, token_budget: int) -> str:
+    """Most recent conversation lines that fit in `token_budget`."""
+    kept, used = [], 0
+    for line in reversed(lines):
+        tokens = estimate_tokens(line) + 1
+        if used + tokens > token_budget:
+            break
+        kept.append(line)
+        used += tokens
+    return "\n".join(reversed(kept))
@@ -6,6 +6,15 @@ OLLAMA_BASE = os.getenv("OLLAMA_BASE", "http://localhost:11434")
 OLLAMA_GENERATE = OLLAMA_BASE.rstrip("/") + "/api/generate"
 DEFAULT_MODEL = os.getenv("OLLAMA_GEN_MODEL", "llama3.2:latest")
 
+# Token counts / durations reported by /api/generate
+USAGE_KEYS = (
+    "prompt_eval_count",
+    "eval_count",
+    "prompt_eval_duration",
+    "eval_duration",
+    "total_duration",
+)
+
 
 def _role_system_prompt(role: str) -> str:
     """
@@ -46,6 +55,22 @@ def _mode_instructions(mode: Optional[str]) -> str:
     )
 
 
+def preload_model(model: Optional[str] = None, keep_alive: str = "30m", timeout: int = 120):
+    """
+    Have Ollama load `model` into memory without generating anything (an
+    empty prompt only loads it), so the first real question does not pay
+    for it. Raises on HTTP errors.
+    """
+    payload = {
+        "model": model or DEFAULT_MODEL,
+        "prompt": "",
+        "keep_alive": keep_alive,
+        "stream": False,
+    }
+    resp = requests.post(OLLAMA_GENERATE, json=payload, timeout=timeout)
+    resp.raise_for_status()
+
+
 def generate_answer(
     context: str,
     question: str,
@@ -54,7 +79,13 @@ def generate_answer(
     model: Optional[str] = None,
     max_tokens: int = 512,
     timeout: int = 60,
+    usage: Optional[dict] = None,
 ) -> str:
+    """
+    Generate an answer with Ollama. If `usage` is a dict, it is filled with
+    Ollama's token counts and durations for the call (prompt_eval_count,
+    eval_count, prompt_eval_duration, eval_duration, total_duration; ns).
+    """
 
     if model is None:
         model = DEFAULT_MODEL
@@ -92,6 +123,11 @@ def generate_answer(
         resp.raise_for_status()
         data = resp.json()
 
+        if usage is not None and isinstance(data, dict):
+            for k in USAGE_KEYS:
+                if k in data:
+                    usage[k] = data[k]
+
         # Ollama returns the final generated text in "response"
         if isinstance(data, dict) and "response" in data:
             text = data.get("response", "")
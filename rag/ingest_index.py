@@ -1,45 +1,161 @@
-import pickle
-from ingest.embed import get_embedding
-from ingest.load_pdf import load_pdfs
-from ingest.chunk import chunk_pdf_documents
-from rag.vectorstore import FaissVectorStore
+import argparse
+import os
+from rag.collection_store import (
+    DEFAULT_COLLECTION,
+    PREFIX_DIMS,
+    VECTOR_STORAGE,
+    index_paths,
+    load_store,
+    manifest_path,
+    new_store,
+    papers_dir,
+    save_store,
+)
+from rag.ingest_pipeline import IngestPipeline
+from rag.manifest import (
+    load_manifest,
+    new_manifest,
+    save_manifest,
+    scan_papers,
+)
+from rag.vectorstore import STORAGE_MODES
 
 
-INDEX_DIR = "rag/index"
-FAISS_PATH = f"{INDEX_DIR}/faiss.index"
-META_PATH = f"{INDEX_DIR}/metadata.pkl"
+def main(
+    collection: str = DEFAULT_COLLECTION,
+    full: bool = False,
+    embed_batch: int = 32,
+    embed_workers: int = 1,
+    checkpoint_every: int = 1000,
+    storage: str = None,
+    prefix_dims: int = None,
+):
+    """
+    Bring one collection's index up to date with its papers directory.
 
+    Only files that were added or changed since the last run (per the
+    collection's manifest) are parsed, chunked and embedded; chunks of
+    deleted files are removed and everything else is left untouched.
+    Without a manifest, or with `full=True`, the index is rebuilt from
+    scratch. Other collections are never touched.
 
-def main():
-    print("Loading PDFs...")
-    documents = load_pdfs("data/papers")
+    Files go through rag.ingest_pipeline; the index and manifest are saved
+    at every checkpoint, so an interrupted run resumes with the files it
+    had not finished.
 
-    if not documents:
-        raise RuntimeError("No PDFs found in data/papers")
+    `storage` and `prefix_dims` (default: RAG_VECTOR_STORAGE and
+    RAG_PREFIX_DIMS) set the index layout of a new or rebuilt index; an
+    existing index keeps the layout it was saved with.
+    """
+    pdf_dir = papers_dir(collection)
+    faiss_path = index_paths(collection)[0]
+    mpath = manifest_path(collection)
 
-    print("Chunking documents...")
-    chunks = chunk_pdf_documents(documents)
+    manifest = None if full else load_manifest(mpath)
+    if manifest is not None and os.path.exists(faiss_path):
+        print(f"Loading index for collection '{collection}'...")
+        store = load_store(collection)
+        if storage and storage != store.storage:
+            print(f"Index uses {store.storage} storage; rerun with --full to switch to {storage}.")
+    else:
+        if not full:
+            print("No manifest found, rebuilding from scratch.")
+        manifest = new_manifest()
+        store = new_store(collection, storage, prefix_dims)
+        layout = store.storage
+        if layout == "prefix":
+            layout += f", {store.prefix_dims} dims"
+        print(f"Building FAISS index ({layout} storage)...")
 
-    print("Building FAISS index...")
-    DIM = 768
-    store = FaissVectorStore(dim=DIM)
+    print(f"Scanning {pdf_dir}...")
+    diff = scan_papers(pdf_dir, manifest)
+    to_index = diff["added"] + diff["changed"]
 
-    for i, c in enumerate(chunks, 1):
-        emb = get_embedding(c["text"])
-        store.add(emb, c)
+    print(
+        f"{len(diff['added'])} added, {len(diff['changed'])} changed, "
+        f"{len(diff['deleted'])} deleted, {len(diff['unchanged'])} unchanged"
+    )
 
-        if i % 20 == 0:
-            print(f"Embedded {i}/{len(chunks)} chunks")
+    if not diff["entries"] and not diff["deleted"]:
+        raise RuntimeError(f"No PDFs found in {pdf_dir}")
 
-    print("Saving FAISS index...")
-    store.save(FAISS_PATH)
+    if not to_index and not diff["deleted"] and store.index.ntotal:
+        manifest["files"] = diff["entries"]
+        save_manifest(mpath, manifest)
+        print("Index is up to date ✅")
+        return
 
-    print("Saving metadata...")
-    with open(META_PATH, "wb") as f:
-        pickle.dump(store.metadata, f)
+    # Added files are included in case a previous run saved the index but
+    # crashed before writing the manifest.
+    removed = store.remove_sources(diff["deleted"] + to_index)
+    if removed:
+        print(f"Removed {removed} stale chunks")
+
+    # Files already indexed (and kept) stay in the manifest at every
+    # checkpoint; pending ones are added as they complete.
+    pending = set(to_index)
+    kept = {n: e for n, e in diff["entries"].items() if n not in pending}
+
+    def checkpoint(completed):
+        save_store(collection, store)
+        manifest["files"] = {**kept, **{n: diff["entries"][n] for n in completed}}
+        save_manifest(mpath, manifest)
+
+    if to_index:
+        print(f"Indexing {len(to_index)} files...")
+        pipeline = IngestPipeline(
+            store,
+            pdf_dir,
+            diff["entries"],
+            on_checkpoint=checkpoint,
+            embed_batch=embed_batch,
+            embed_workers=embed_workers,
+            checkpoint_every=checkpoint_every,
+        )
+        pipeline.run(to_index)
+    else:
+        checkpoint([])
 
     print("Ingestion complete ✅")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Update a collection's FAISS index")
+    parser.add_argument(
+        "--collection", default=DEFAULT_COLLECTION,
+        help="collection to update (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--full", action="store_true",
+        help="ignore the manifest and rebuild the collection from scratch",
+    )
+    parser.add_argument(
+        "--embed-batch", type=int, default=32,
+        help="chunks per embedding request (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--embed-workers", type=int, default=1,
+        help="concurrent embedding requests (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--checkpoint-every", type=int, default=1000,
+        help="save index and manifest every N chunks (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--storage", choices=STORAGE_MODES,
+        help=f"index layout when building (default: {VECTOR_STORAGE})",
+    )
+    parser.add_argument(
+        "--prefix-dims", type=int,
+        help=f"first-stage dimensions of prefix storage (default: {PREFIX_DIMS})",
+    )
+    args = parser.parse_args()
+    main(
+        args.collection,
+        full=args.full,
+        embed_batch=args.embed_batch,
+        embed_workers=args.embed_workers,
+        checkpoint_every=args.checkpoint_every,
+        storage=args.storage,
+        prefix_dims=args.prefix_dims,
+    )
@@ -0,0 +1,293 @@
+"""
+Pipelined ingest: parse → chunk → embed → index.
+
+Each stage runs in its own thread(s), connected by bounded queues, so only
+a few files' worth of text is in flight at any time no matter how large
+the corpus is. Embedding workers may finish batches out of order, so the
+index stage holds a file's batches until all of them have arrived and then
+buffers its chunks in document order, flushing them into the store at
+checkpoints; after each flush the caller persists the
+store and records which files are fully indexed, so a restart only redoes
+files that were not finished.
+"""
+import os
+import queue
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from ingest.chunk import chunk_pdf_documents
+from ingest.embed import get_embeddings
+from ingest.load_pdf import load_pdf
+from rag.manifest import chunk_ids
+
+
+_DONE = object()
+
+
+class _StageStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+
+    def add(self, n: int = 1):
+        with self._lock:
+            self.items += n
+
+    def rate(self) -> float:
+        elapsed = time.perf_counter() - self._started
+        return self.items / elapsed if elapsed > 0 else 0.0
+
+
+class IngestPipeline:
+    """
+    Args:
+        store (FaissVectorStore): Store to add chunks to. It must not be
+            searched concurrently: chunks are added in place.
+        pdf_dir (str): Directory holding the files to ingest
+        entries (dict): Manifest entries (rag.manifest.file_entry) per file
+            name; chunk ids are filled in as files are chunked
+        on_checkpoint (callable): Called with the list of fully indexed
+            file names after every flush into the store
+        embed_batch (int): Chunks per embedding request
+        embed_workers (int): Concurrent embedding requests
+        queue_size (int): Bound of every inter-stage queue
+        checkpoint_every (int): Flush after this many buffered chunks...
+        checkpoint_seconds (float): ...or this many seconds
+        checkpoint_growth (float): Once the index is large, flush only
+            when the buffer holds this fraction of it...
+        checkpoint_overhead (float): ...and wait until checkpoints would
+            take at most this share of the time, judged by the last one
+        progress (bool): Print a live progress line to stderr
+    """
+
+    def __init__(
+        self,
+        store,
+        pdf_dir: str,
+        entries: dict,
+        on_checkpoint,
+        embed_batch: int = 32,
+        embed_workers: int = 1,
+        queue_size: int = 8,
+        checkpoint_every: int = 1000,
+        checkpoint_seconds: float = 60.0,
+        checkpoint_growth: float = 0.25,
+        checkpoint_overhead: float = 0.1,
+        progress: bool = True,
+    ):
+        self.store = store
+        self.pdf_dir = pdf_dir
+        self.entries = entries
+        self.on_checkpoint = on_checkpoint
+        self.embed_batch = embed_batch
+        self.embed_workers = embed_workers
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_seconds = checkpoint_seconds
+        self.checkpoint_growth = checkpoint_growth
+        self.checkpoint_overhead = checkpoint_overhead
+        self.progress = progress
+
+        self._docs = queue.Queue(maxsize=queue_size)
+        self._batches = queue.Queue(maxsize=queue_size)
+        self._embedded = queue.Queue(maxsize=queue_size)
+
+        self._stop = threading.Event()
+        self._error = None
+
+        self.stats = {
+            name: _StageStats(name) for name in ("parse", "chunk", "embed", "index")
+        }
+
+    # -----------------------------
+    # Queue helpers
+    # -----------------------------
+    def _put(self, q, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while True:
+            try:
+                return q.get(timeout=0.2)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return _DONE
+
+    def _thread(self, target, *args):
+        def run():
+            try:
+                target(*args)
+            except Exception as e:
+                self._error = e
+                self._stop.set()
+
+        t = threading.Thread(target=run, daemon=True)
+        t.start()
+        return t
+
+    # -----------------------------
+    # Stages
+    # -----------------------------
+    def _parse(self, names):
+        for name in names:
+            documents = load_pdf(os.path.join(self.pdf_dir, name))
+            self.stats["parse"].add()
+            if not self._put(self._docs, (name, documents)):
+                return
+        self._put(self._docs, _DONE)
+
+    def _chunk(self):
+        while True:
+            item = self._get(self._docs)
+            if item is _DONE:
+                break
+
+            name, documents = item
+            entry = self.entries[name]
+            chunks = chunk_pdf_documents(documents)
+            entry["chunk_ids"] = chunk_ids(entry["sha256"], len(chunks))
+
+            # Papers added through the CLI get their file mtime as upload date
+            for c, chunk_id in zip(chunks, entry["chunk_ids"]):
+                c["uploaded_at"] = entry["mtime"]
+                c["chunk_id"] = chunk_id
+
+            # A file with no text still sends one (empty) batch so the
+            # index stage can mark it complete.
+            size = self.embed_batch
+            batches = [chunks[i:i + size] for i in range(0, len(chunks), size)] or [[]]
+            for seq, batch in enumerate(batches):
+                if not self._put(self._batches, (name, seq, len(batches), batch)):
+                    return
+            self.stats["chunk"].add(len(chunks))
+
+        for _ in range(self.embed_workers):
+            self._put(self._batches, _DONE)
+
+    def _embed(self):
+        while True:
+            item = self._get(self._batches)
+            if item is _DONE:
+                break
+
+            name, seq, n_batches, batch = item
+            embeddings = get_embeddings([c["text"] for c in batch]) if batch else None
+            self.stats["embed"].add(len(batch))
+            if not self._put(self._embedded, (name, seq, n_batches, batch, embeddings)):
+                return
+
+        self._put(self._embedded, _DONE)
+
+    # -----------------------------
+    # Progress
+    # -----------------------------
+    def _progress_line(self) -> str:
+        parts = []
+        for name, s in self.stats.items():
+            unit = "files" if name == "parse" else "chunks"
+            parts.append(f"{name} {s.items} {unit} ({s.rate():.1f}/s)")
+        queues = "/".join(str(q.qsize()) for q in (self._docs, self._batches, self._embedded))
+        return " | ".join(parts) + f" | queued {queues}"
+
+    def _report(self, done: threading.Event):
+        while not done.wait(0.5):
+            sys.stderr.write("\r" + self._progress_line())
+            sys.stderr.flush()
+
+    # -----------------------------
+    # Run
+    # -----------------------------
+    def run(self, names: list) -> list:
+        """
+        Ingest `names` (files in pdf_dir). Returns the names of the files
+        that were fully indexed; raises if any stage failed.
+        """
+        threads = [self._thread(self._parse, names), self._thread(self._chunk)]
+        threads += [self._thread(self._embed) for _ in range(self.embed_workers)]
+
+        reporting = threading.Event()
+        reporter = None
+        if self.progress:
+            reporter = threading.Thread(target=self._report, args=(reporting,), daemon=True)
+            reporter.start()
+
+        completed = []
+        try:
+            self._index(completed)
+        finally:
+            self._stop.set()
+            for t in threads:
+                t.join()
+            reporting.set()
+            if reporter is not None:
+                reporter.join()
+                sys.stderr.write("\r" + self._progress_line() + "\n")
+
+        if self._error is not None:
+            raise self._error
+        return completed
+
+    def _index(self, completed: list):
+        vectors, metas = [], []
+        # Embedded batches per file, by position, until the file is complete
+        received = defaultdict(dict)
+        ready = []
+        last_flush = time.perf_counter()
+        checkpoint_seconds = 0.0
+        workers_left = self.embed_workers
+
+        def flush():
+            nonlocal last_flush, checkpoint_seconds
+            if metas:
+                # In place: nothing searches this store while it is built
+                self.store.add_batch(np.vstack(vectors), metas, copy=False)
+                self.stats["index"].add(len(metas))
+                vectors.clear()
+                metas.clear()
+            completed.extend(ready)
+            ready.clear()
+            t0 = time.perf_counter()
+            self.on_checkpoint(list(completed))
+            last_flush = time.perf_counter()
+            checkpoint_seconds = last_flush - t0
+
+        while workers_left:
+            item = self._get(self._embedded)
+            if item is _DONE:
+                if self._stop.is_set():
+                    return
+                workers_left -= 1
+                continue
+
+            name, seq, n_batches, batch, embeddings = item
+            received[name][seq] = (batch, embeddings)
+            if len(received[name]) == n_batches:
+                # Add the whole file at once, in document order
+                for seq in range(n_batches):
+                    batch, embeddings = received[name][seq]
+                    if batch:
+                        vectors.append(embeddings)
+                        metas.extend(batch)
+                ready.append(name)
+                del received[name]
+
+            # A checkpoint rewrites the whole index, so both triggers grow
+            # with it: checkpoints get geometrically further apart and the
+            # total written stays linear in the final index size.
+            due_rows = max(self.checkpoint_every, self.checkpoint_growth * self.store.index.ntotal)
+            due_seconds = max(self.checkpoint_seconds, checkpoint_seconds / self.checkpoint_overhead)
+            if len(metas) >= due_rows or time.perf_counter() - last_flush >= due_seconds:
+                flush()
+
+        flush()
@@ -0,0 +1,129 @@
+"""
+Manifest of the papers indexed in a collection, used for incremental
+rebuilds. Stored as JSON next to the collection's index:
+
+    {
+        "version": 1,
+        "files": {
+            "paper.pdf": {
+                "size": 123456,
+                "mtime": 1700000000.0,
+                "sha256": "...",
+                "chunk_ids": ["<sha prefix>-0", "<sha prefix>-1", ...]
+            }
+        }
+    }
+
+Size and mtime are a cheap first check; the content hash decides whether a
+file whose stat changed really needs re-indexing.
+"""
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+
+MANIFEST_VERSION = 1
+
+# Serializes read-modify-write of manifests within one process
+_lock = threading.Lock()
+
+
+def new_manifest() -> dict:
+    return {"version": MANIFEST_VERSION, "files": {}}
+
+
+def load_manifest(path: str):
+    """Return the manifest at `path`, or None if there is none yet."""
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def save_manifest(path: str, manifest: dict):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def update_manifest(path: str, entries: dict = None, removed=()):
+    """
+    Set and/or drop file entries in the manifest at `path` (created if
+    missing). Safe to call from concurrent request handlers.
+    """
+    with _lock:
+        manifest = load_manifest(path) or new_manifest()
+        manifest["files"].update(entries or {})
+        for name in removed:
+            manifest["files"].pop(name, None)
+        save_manifest(path, manifest)
+
+
+def file_sha256(path, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_entry(path, sha256: str = None) -> dict:
+    """Stat + content hash for a file (chunk ids are filled in by the caller)."""
+    st = os.stat(path)
+    return {
+        "size": st.st_size,
+        "mtime": st.st_mtime,
+        "sha256": sha256 or file_sha256(path),
+        "chunk_ids": [],
+    }
+
+
+def chunk_ids(sha256: str, n: int) -> list:
+    """Stable ids for the chunks of a file, derived from its content hash."""
+    return [f"{sha256[:16]}-{i}" for i in range(n)]
+
+
+def scan_papers(pdf_dir: str, manifest: dict) -> dict:
+    """
+    Diff the PDFs in `pdf_dir` against `manifest`.
+
+    Returns a dict of file-name lists: "added", "changed", "deleted" and
+    "unchanged", plus "entries" with fresh stat/hash entries for every file
+    on disk (unchanged files keep their chunk ids).
+    """
+    known = manifest["files"]
+    diff = {"added": [], "changed": [], "deleted": [], "unchanged": [], "entries": {}}
+
+    on_disk = sorted(Path(pdf_dir).glob("*.pdf")) if os.path.isdir(pdf_dir) else []
+    for path in on_disk:
+        name = path.name
+        old = known.get(name)
+        st = path.stat()
+
+        if old and old["size"] == st.st_size and old["mtime"] == st.st_mtime:
+            diff["unchanged"].append(name)
+            diff["entries"][name] = old
+            continue
+
+        entry = file_entry(path)
+        if old is None:
+            diff["added"].append(name)
+        elif old["sha256"] == entry["sha256"]:
+            # Touched but identical: keep the chunks, refresh the stat
+            entry["chunk_ids"] = old["chunk_ids"]
+            diff["unchanged"].append(name)
+        else:
+            diff["changed"].append(name)
+        diff["entries"][name] = entry
+
+    present = {p.name for p in on_disk}
+    diff["deleted"] = sorted(name for name in known if name not in present)
+    return diff
@@ -0,0 +1,203 @@
+"""
+Lightweight in-process metrics in Prometheus text format.
+
+Histograms and counters are plain lock-protected arrays, so observing a
+value costs about a microsecond; RAG_METRICS=0 turns every observation
+into a no-op. `StageTimer` times the stages of one request, feeding the
+stage histogram and, when the caller asked for it, a per-request
+`timings` dict in milliseconds.
+"""
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+METRICS_ENABLED = os.getenv("RAG_METRICS", "1") != "0"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+
+def _label_str(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{v}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        if not values and not self.labels:
+            values = [((), 0)]
+        for key, value in values:
+            lines.append(f"{self.name}{_label_str(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets=LATENCY_BUCKETS, labels=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        # label values -> [bucket counts..., +Inf count, sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = tuple(labels.get(n, "") for n in self.labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[i] += 1
+            series[-1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((k, list(v)) for k, v in self._series.items())
+
+        for key, counts in series:
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), counts[:-1]):
+                cumulative += n
+                labels = _label_str(self.labels + ("le",), key + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _label_str(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {counts[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+# -----------------------------
+# Metrics
+# -----------------------------
+STAGE_SECONDS = Histogram(
+    "rag_stage_seconds",
+    "Time spent per request stage (embed, search, mmr, context, generate).",
+    labels=("stage",),
+)
+REQUEST_SECONDS = Histogram(
+    "rag_request_seconds",
+    "End-to-end latency per endpoint and route.",
+    labels=("endpoint", "route"),
+)
+OLLAMA_TOKENS = Histogram(
+    "rag_ollama_tokens",
+    "Tokens per generation reported by Ollama (prompt_eval_count / eval_count).",
+    buckets=TOKEN_BUCKETS,
+    labels=("kind",),
+)
+OLLAMA_SECONDS = Histogram(
+    "rag_ollama_seconds",
+    "Ollama-reported durations per generation (prompt_eval, eval, total).",
+    labels=("kind",),
+)
+CACHE_REQUESTS = Counter(
+    "rag_cache_requests_total",
+    "Cache lookups by cache and result (hit/miss).",
+    labels=("cache", "result"),
+)
+GATED_REQUESTS = Counter(
+    "rag_gated_requests_total",
+    "Questions answered without generation by the retrieval gate.",
+)
+
+REGISTRY = [STAGE_SECONDS, REQUEST_SECONDS, OLLAMA_TOKENS, OLLAMA_SECONDS, CACHE_REQUESTS, GATED_REQUESTS]
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def observe_generation(usage: dict):
+    """Record the counts / durations generate_answer put in `usage`."""
+    for kind, key in (("prompt", "prompt_eval_count"), ("completion", "eval_count")):
+        if key in usage:
+            OLLAMA_TOKENS.observe(usage[key], kind=kind)
+    for kind in ("prompt_eval", "eval", "total"):
+        key = f"{kind}_duration"
+        if key in usage:
+            OLLAMA_SECONDS.observe(usage[key] / 1e9, kind=kind)
+
+
+def observe_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+class StageTimer:
+    """
+    Times the stages of one request:
+
+        timer = StageTimer(trace=req.timings)
+        with timer.stage("embed"):
+            ...
+        timer.timings  # {"embed_ms": ..., "total_ms": ...} when tracing
+
+    Stages always feed STAGE_SECONDS (unless metrics are off); the
+    per-request dict is only kept when `trace` is true.
+    """
+
+    def __init__(self, trace: bool = False):
+        self.trace = trace
+        self.started = time.perf_counter()
+        self._timings = {} if trace else None
+
+    @contextmanager
+    def stage(self, name: str):
+        if not METRICS_ENABLED and not self.trace:
+            yield
+            return
+
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - t0)
+
+    def record(self, name: str, seconds: float):
+        """Record a stage measured elsewhere (e.g. shared by a batch)."""
+        STAGE_SECONDS.observe(seconds, stage=name)
+        if self._timings is not None:
+            self._timings[f"{name}_ms"] = round(
+                self._timings.get(f"{name}_ms", 0.0) + 1000 * seconds, 1
+            )
+
+    def finish(self, endpoint: str, route: str = ""):
+        elapsed = time.perf_counter() - self.started
+        REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, route=route)
+        if self._timings is not None:
+            self._timings["total_ms"] = round(1000 * elapsed, 1)
+
+    def elapsed_ms(self) -> float:
+        return 1000 * (time.perf_counter() - self.started)
+
+    @property
+    def timings(self):
+        return self._timings
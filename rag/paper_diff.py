@@ -0,0 +1,164 @@
+"""
+Semantic diff of two papers from their stored chunk vectors.
+
+Instead of a line diff over the raw text, every chunk of paper A is
+compared with every chunk of paper B in one matrix product of their exact
+(normalized) embeddings. From the chunk x chunk cosine matrix:
+
+- matches: runs of consecutive A chunks whose best B chunk scores at least
+  the threshold, aligned with the B chunks they map to,
+- unique_a / unique_b: runs of chunks with no counterpart above the
+  threshold in the other paper,
+- similarity: mean best-match score over the chunks of both papers, and
+  coverage_a / coverage_b: the share of each paper that has a match.
+
+Results are cached by a hash of both papers' chunk texts, so a diff is
+recomputed only when a paper's content changes.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from rag.context import merge_text
+
+
+# Cosine score at which two chunks count as covering the same content
+DIFF_THRESHOLD = float(os.getenv("RAG_DIFF_THRESHOLD", "0.8"))
+
+# Diffs kept in memory (least recently used are dropped first)
+DIFF_CACHE_SIZE = int(os.getenv("RAG_DIFF_CACHE_SIZE", "128"))
+
+# Characters of text returned per section
+SNIPPET_CHARS = 300
+
+# A match run continues while the B chunk moves forward by at most this
+MAX_ALIGN_STEP = 2
+
+
+def content_hash(chunks) -> str:
+    digest = hashlib.sha256()
+    for c in chunks:
+        digest.update(c["text"].encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def _span(chunks, ids) -> dict:
+    """Chunk range, page range and leading text of a run of chunks."""
+    text = ""
+    for i in ids:
+        text = merge_text(text, chunks[i]["text"]) if text else chunks[i]["text"]
+        if len(text) >= SNIPPET_CHARS:
+            break
+    if len(text) > SNIPPET_CHARS:
+        text = text[:SNIPPET_CHARS].rstrip() + " …"
+
+    pages = [chunks[i]["page"] for i in ids]
+    return {
+        "chunks": [int(ids[0]), int(ids[-1])],
+        "pages": [min(pages), max(pages)],
+        "text": text.strip(),
+    }
+
+
+def _runs(ids) -> list:
+    """Split sorted chunk indices into runs of consecutive ones."""
+    runs = []
+    for i in ids:
+        if runs and runs[-1][-1] == i - 1:
+            runs[-1].append(i)
+        else:
+            runs.append([i])
+    return runs
+
+
+def _aligned_runs(best, matched) -> list:
+    """
+    Group matched A chunks into sections: consecutive in A, with their
+    best B chunks moving forward by at most MAX_ALIGN_STEP.
+    """
+    runs = []
+    for i in np.flatnonzero(matched):
+        j = best[i]
+        if runs:
+            prev_i, prev_j = runs[-1][-1]
+            if i == prev_i + 1 and 0 <= j - prev_j <= MAX_ALIGN_STEP:
+                runs[-1].append((i, j))
+                continue
+        runs.append([(i, j)])
+    return runs
+
+
+def diff_papers(chunks_a, vectors_a, chunks_b, vectors_b, threshold: float = DIFF_THRESHOLD) -> dict:
+    """
+    Args:
+        chunks_a, chunks_b (list[dict]): chunk metadata in document order
+        vectors_a, vectors_b (np.ndarray): matching rows of normalized
+            embeddings
+        threshold (float): cosine score for two chunks to match
+    """
+    a = np.asarray(vectors_a, dtype="float32")
+    b = np.asarray(vectors_b, dtype="float32")
+    sim = a @ b.T
+
+    best_b = sim.argmax(axis=1)
+    score_a = sim[np.arange(len(a)), best_b]
+    score_b = sim.max(axis=0)
+
+    matched_a = score_a >= threshold
+    matched_b = score_b >= threshold
+
+    matches = []
+    for run in _aligned_runs(best_b, matched_a):
+        ids_a = [i for i, _ in run]
+        ids_b = sorted({j for _, j in run})
+        matches.append({
+            "score": round(float(score_a[ids_a].mean()), 4),
+            "a": _span(chunks_a, ids_a),
+            "b": _span(chunks_b, ids_b),
+        })
+
+    return {
+        "threshold": threshold,
+        "similarity": round(float((score_a.sum() + score_b.sum()) / (len(a) + len(b))), 4),
+        "coverage_a": round(float(matched_a.mean()), 4),
+        "coverage_b": round(float(matched_b.mean()), 4),
+        "chunks_a": len(a),
+        "chunks_b": len(b),
+        "matches": matches,
+        "unique_a": [_span(chunks_a, run) for run in _runs(np.flatnonzero(~matched_a))],
+        "unique_b": [_span(chunks_b, run) for run in _runs(np.flatnonzero(~matched_b))],
+    }
+
+
+class DiffCache:
+    """
+    Args:
+        max_entries (int): Diffs kept before the least recently used is dropped
+    """
+
+    def __init__(self, max_entries: int = DIFF_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, chunks_a, vectors_a, chunks_b, vectors_b, threshold: float = DIFF_THRESHOLD):
+        """Returns (diff, cached)."""
+        key = (content_hash(chunks_a), content_hash(chunks_b), threshold)
+        with self._lock:
+            diff = self._entries.get(key)
+            if diff is not None:
+                self._entries.move_to_end(key)
+                return diff, True
+
+        diff = diff_papers(chunks_a, vectors_a, chunks_b, vectors_b, threshold)
+
+        with self._lock:
+            self._entries[key] = diff
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return diff, False
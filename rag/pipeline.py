@@ -0,0 +1,222 @@
+"""
+The question-answering pipeline behind /ask, shared by /ask_batch,
+`rag.query` and `rag.replay` so they cannot drift apart:
+
+    route → embed → global shortlist → MMR → relevance gate → context → generate
+
+Questions are routed by type (rag.routing). Summary questions are served
+by the caller's `summaries` function when it has one (the API's
+precomputed per-paper summaries) and otherwise take their route's
+fallback retrieval. HTTP errors, chat memory, metrics and logging stay
+with the callers; every stage is timed on the caller's StageTimer.
+"""
+from collections import defaultdict
+
+import numpy as np
+
+from ingest.embed import get_embedding
+from rag.confidence import passes_gate, relevance
+from rag.context import CONTEXT_TOKEN_BUDGET, estimate_tokens, pack_context, trim_conversation
+from rag.generator import generate_answer
+from rag.metrics import StageTimer
+from rag.question_type import classify_question
+from rag.routing import ROUTES
+
+
+# Chat turns considered for a follow-up's context
+HISTORY_TURNS = 6
+
+
+class PipelineError(RuntimeError):
+    """
+    A pipeline stage failed. `stage` is "embed", "search" or "generate";
+    the original exception is the __cause__.
+    """
+
+    def __init__(self, stage: str, error: Exception):
+        super().__init__(str(error))
+        self.stage = stage
+
+
+def route_question(question: str, summaries: bool = False):
+    """
+    (name, settings) of the route `question` takes. Summary routes fall
+    back to their retrieval route unless `summaries` can serve them.
+    """
+    name = classify_question(question)
+    route = ROUTES.get(name, ROUTES["fact"])
+    if not summaries and not route.get("retrieve", True):
+        name = route["fallback"]
+        route = ROUTES[name]
+    return name, route
+
+
+def with_top_k(route: dict, top_k: int = None) -> dict:
+    """
+    `route` with its `top_k` replaced; the shortlist grows with it so MMR
+    always has at least `top_k` candidates to pick from.
+    """
+    if top_k is None:
+        return route
+    return {**route, "top_k": top_k, "fetch_k": max(route["fetch_k"], top_k)}
+
+
+def retrieve(store, query_embedding, route: dict, filters: dict = None, timer: StageTimer = None) -> list:
+    """
+    The route's `top_k` chunks, picked by MMR from a global `fetch_k`
+    shortlist over the selected collections of `store` (a CollectionStore).
+    Raises KeyError for unknown collections.
+    """
+    from rag.vectorstore import mmr_select  # faiss is only needed once searching
+
+    timer = timer or StageTimer()
+    query_embedding = query_embedding / np.linalg.norm(query_embedding)
+    with timer.stage("search"):
+        candidates = store.mmr_candidates(query_embedding, fetch_k=route["fetch_k"], filters=filters)
+    with timer.stage("mmr"):
+        return mmr_select(query_embedding, candidates, top_k=route["top_k"])
+
+
+def retrieve_batch(store, query_embeddings, routes: list, filters: dict = None) -> list:
+    """
+    `retrieve` for many questions: one matrix search and vectorized MMR
+    pass (CollectionStore.search_mmr_batch) per distinct (fetch_k, top_k)
+    among `routes`. One chunk list per query, in order.
+    """
+    groups = defaultdict(list)
+    for i, route in enumerate(routes):
+        groups[route["fetch_k"], route["top_k"]].append(i)
+
+    results = [None] * len(routes)
+    for (fetch_k, top_k), rows in groups.items():
+        picked = store.search_mmr_batch(
+            [query_embeddings[i] for i in rows], top_k=top_k, fetch_k=fetch_k, filters=filters
+        )
+        for i, chunks in zip(rows, picked):
+            results[i] = chunks
+    return results
+
+
+def build_context(store, chunks, conversation: str = "", token_budget: int = CONTEXT_TOKEN_BUDGET):
+    """
+    Pack retrieved chunks (plus the conversation so far) into the token
+    budget, see rag.context. Returns (context, chunks actually used).
+    """
+    context, used = pack_context(
+        chunks,
+        token_budget=token_budget - estimate_tokens(conversation),
+        lookup=lambda hit, offset: store.chunk(hit["collection"], hit["id"] + offset),
+    )
+    if conversation:
+        context = conversation + "\n\n" + context
+    return context, used
+
+
+def ask(
+    store,
+    question: str,
+    role: str = "student",
+    filters: dict = None,
+    history=(),
+    embedding=None,
+    chunks=None,
+    top_k: int = None,
+    summaries=None,
+    generate=generate_answer,
+    retrieval_only: bool = False,
+    timer: StageTimer = None,
+) -> dict:
+    """
+    Answer one question the way /ask does.
+
+    Args:
+        store (CollectionStore): Collections to search
+        question (str): The question, stripped and non-empty
+        role (str): Answer style passed to `generate`
+        filters (dict): CollectionStore filters
+        history (list[str]): Chat turns so far. Follow-ups are not gated,
+            and the conversation takes at most half the context budget.
+        embedding (np.ndarray): Question embedding, when the caller
+            already has it (e.g. from a batched call)
+        chunks (list): The MMR picks, when the caller already retrieved
+            them for this question's retrieval route (e.g. with
+            retrieve_batch); skips embedding and search
+        top_k (int): Chunks to retrieve instead of the route's `top_k`
+        summaries (callable): summaries(question, max_papers) returns a
+            dict with "answer", "sources", "papers", "cached" and "usage"
+            (a list), or None when it cannot serve the question; without
+            it summary questions take their fallback route
+        generate (callable): generate_answer-compatible function
+        retrieval_only (bool): Stop after MMR
+        timer (StageTimer): Receives the stage timings
+
+    Returns a dict with the "route" taken. Summary answers carry the
+    `summaries` dict's keys and "summary": True. Otherwise "chunks" holds
+    the MMR picks (with their 0–100 "confidence") and, unless
+    `retrieval_only`, "gated" tells whether the relevance gate stopped the
+    question; answered questions add "answer", "context",
+    "context_chunks" (the chunks packed into the context) and "usage".
+
+    Raises PipelineError when a stage fails, KeyError for unknown
+    collections.
+    """
+    timer = timer or StageTimer()
+    route_name, route = route_question(question, summaries is not None)
+
+    if not route.get("retrieve", True):
+        with timer.stage("summary"):
+            served = summaries(question, route.get("max_papers", 1))
+        if served is not None:
+            return {**served, "route": route_name, "summary": True}
+        route_name = route["fallback"]
+        route = ROUTES[route_name]
+    route = with_top_k(route, top_k)
+    result = {"route": route_name}
+
+    if chunks is None and embedding is None:
+        try:
+            with timer.stage("embed"):
+                embedding = get_embedding(question)
+        except Exception as e:
+            raise PipelineError("embed", e) from e
+
+    if chunks is None:
+        try:
+            chunks = retrieve(store, embedding, route, filters, timer)
+        except KeyError:
+            raise
+        except Exception as e:
+            raise PipelineError("search", e) from e
+    for c in chunks:
+        c["confidence"] = relevance(c["score"])
+    result["chunks"] = chunks
+    if retrieval_only:
+        return result
+
+    # Skip generation when nothing relevant was retrieved. Follow-ups in
+    # an ongoing chat are not gated: they can lean on the conversation.
+    result["gated"] = not chunks or (not history and not passes_gate(chunks))
+    if result["gated"]:
+        return result
+
+    budget = route["context_tokens"]
+    conversation = trim_conversation(list(history)[-HISTORY_TURNS:], budget // 2)
+    with timer.stage("context"):
+        context, used = build_context(store, chunks, conversation, token_budget=budget)
+
+    usage = {}
+    try:
+        with timer.stage("generate"):
+            answer = generate(
+                context=context,
+                question=question,
+                mode=route_name,
+                role=role,
+                max_tokens=route["num_predict"],
+                usage=usage,
+            )
+    except Exception as e:
+        raise PipelineError("generate", e) from e
+
+    result.update(answer=answer, context=context, context_chunks=used, usage=usage)
+    return result
@@ -1,23 +1,154 @@
-import pickle
-from ingest.embed import get_embedding
-from rag.vectorstore import FaissVectorStore
-from rag.generator import generate_answer
+"""
+Ask questions without the API server, interactively or in batch:
 
+    python -m rag.query
+    python -m rag.query --batch questions.jsonl --out answers.jsonl --workers 4
+    python -m rag.query --batch questions.jsonl --retrieval-only
 
-INDEX_DIR = "rag/index"
-FAISS_PATH = f"{INDEX_DIR}/faiss.index"
-META_PATH = f"{INDEX_DIR}/metadata.pkl"
+Every question goes through rag.pipeline, the same code as /ask: routed
+by type (rag.routing), a global MMR shortlist over the selected
+collections, the relevance gate, context packing (rag.context) and
+generation with the route's answer budget. Summary questions use their
+route's fallback retrieval, as /ask does when they name no paper
+(precomputed summaries are API-only). There is no chat memory: every
+question stands alone.
 
+Batch input is JSONL with one question per line, either a JSON string or
+an object with "question" and optional "id", "role", "collections",
+"sources" and "pages". Each output line holds the input index and id, the
+route, the retrieved chunk ids and scores, the chunks packed into the
+context, the answer, Ollama's token counts and per-stage timings in ms,
+written in completion order. --retrieval-only stops after MMR, to
+benchmark the index on its own. A throughput summary goes to stderr.
+"""
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-def main():
-    print("Loading vector database...")
+import numpy as np
 
-    with open(META_PATH, "rb") as f:
-        metadata = pickle.load(f)
+from rag import pipeline
+from rag.collection_store import CollectionStore
+from rag.confidence import NOT_FOUND_ANSWER
+from rag.metrics import StageTimer
+from rag.slow_log import chunk_refs
 
-    store = FaissVectorStore(dim=768)
-    store.load(FAISS_PATH, metadata)
 
+def load_questions(path: str) -> list:
+    """Questions of a JSONL file as dicts with at least "question"."""
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            items.append({"question": item} if isinstance(item, str) else item)
+    return items
+
+
+def _filters(item: dict, collections=None):
+    filters = {}
+    for key in ("collections", "sources", "pages"):
+        if item.get(key):
+            filters[key] = item[key]
+    if collections and "collections" not in filters:
+        filters["collections"] = collections
+    return filters or None
+
+
+def answer_question(store: CollectionStore, item: dict, retrieval_only: bool = False,
+                    role: str = "student", collections=None) -> dict:
+    """
+    Run one question through retrieval (and, unless `retrieval_only`,
+    the gate and generation). Errors are reported in the result.
+    """
+    question = item["question"].strip()
+    timer = StageTimer(trace=True)
+    result = {"id": item.get("id"), "question": question}
+    if not question:
+        result.update(error="Empty question", timings={})
+        return result
+
+    # Known before any stage runs, so failed questions are reported under it too
+    route_name = result["route"] = pipeline.route_question(question)[0]
+    try:
+        answered = pipeline.ask(
+            store, question,
+            role=item.get("role", role),
+            filters=_filters(item, collections),
+            retrieval_only=retrieval_only,
+            timer=timer,
+        )
+        result["chunks"] = chunk_refs(answered["chunks"])
+
+        if not retrieval_only:
+            if answered["gated"]:
+                result.update(answer=NOT_FOUND_ANSWER, gated=True)
+            else:
+                usage = answered["usage"]
+                result.update(
+                    answer=answered["answer"],
+                    gated=False,
+                    context_chunks=chunk_refs(answered["context_chunks"]),
+                    prompt_tokens=usage.get("prompt_eval_count"),
+                    completion_tokens=usage.get("eval_count"),
+                )
+                if answered["answer"].startswith("[Generation error]"):
+                    result["error"] = answered["answer"]
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+
+    timer.finish("query", route_name)
+    result["timings"] = timer.timings
+    return result
+
+
+def run_batch(store: CollectionStore, items: list, out, workers: int = 4, **options) -> dict:
+    """
+    Answer `items` with a pool of `workers` threads, writing one JSON line
+    per question to `out` as it completes. Returns a throughput summary.
+    """
+    results = []
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(answer_question, store, item, **options): i
+            for i, item in enumerate(items)
+        }
+        for future in as_completed(futures):
+            result = {"index": futures[future], **future.result()}
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            results.append(result)
+    wall = time.perf_counter() - t0
+
+    return summarize(results, wall, workers)
+
+
+def summarize(results: list, wall_s: float, workers: int) -> dict:
+    summary = {
+        "questions": len(results),
+        "workers": workers,
+        "errors": sum(1 for r in results if "error" in r),
+        "gated": sum(1 for r in results if r.get("gated")),
+        "wall_s": round(wall_s, 2),
+        "questions_per_s": round(len(results) / wall_s, 2) if wall_s else None,
+    }
+
+    stages = {}
+    for r in results:
+        for name, ms in r["timings"].items():
+            stages.setdefault(name, []).append(ms)
+    for name, values in sorted(stages.items()):
+        summary[f"{name[:-3]}_p50_ms"] = round(float(np.percentile(values, 50)), 1)
+        summary[f"{name[:-3]}_p95_ms"] = round(float(np.percentile(values, 95)), 1)
+    return summary
+
+
+def interactive(store: CollectionStore, role: str = "student", collections=None):
     print("Ready to answer questions 🚀")
 
     while True:
@@ -28,25 +159,50 @@ def main():
             print("Empty question. Try again.")
             continue
 
-        query_embedding = get_embedding(question)
-        top_chunks = store.search(query_embedding, top_k=3)
-
-        context = "\n\n".join(
-            [
-                f"[{c['source']} | page {c['page']}]\n{c['text']}"
-                for c in top_chunks
-            ]
-        )
-
-        answer = generate_answer(context, question)
+        result = answer_question(store, {"question": question}, role=role, collections=collections)
+        if "error" in result:
+            print(f"\nERROR: {result['error']}")
+            continue
 
         print("\nANSWER:")
-        print(answer)
+        print(result["answer"])
 
         print("\nSOURCES:")
-        for c in top_chunks:
+        for c in result.get("context_chunks") or result["chunks"]:
             print(f"- {c['source']} (page {c['page']})")
 
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ask questions without the API server")
+    parser.add_argument("--batch", metavar="JSONL", help="answer the questions in this file and exit")
+    parser.add_argument("--out", help="write batch results here (default: stdout)")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent questions in batch mode (default: %(default)s)")
+    parser.add_argument("--retrieval-only", action="store_true", help="stop after retrieval: no gate, no generation")
+    parser.add_argument("--role", default="student", help="answer style unless a question sets its own")
+    parser.add_argument("--collections", nargs="+", help="search only these collections")
+    args = parser.parse_args(argv)
+
+    print("Loading vector database...", file=sys.stderr)
+    store = CollectionStore.load_all()
+
+    if not args.batch:
+        interactive(store, args.role, args.collections)
+        return
+
+    items = load_questions(args.batch)
+    options = {
+        "retrieval_only": args.retrieval_only,
+        "role": args.role,
+        "collections": args.collections,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as out:
+            summary = run_batch(store, items, out, args.workers, **options)
+    else:
+        summary = run_batch(store, items, sys.stdout, args.workers, **options)
+
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,180 @@
+"""
+Replay a slow-query log (rag.slow_log) to validate index or config
+changes before rollout.
+
+    python -m rag.replay slow_queries.jsonl
+    python -m rag.replay slow_queries.jsonl --url http://localhost:8000
+
+Without --url, logged /ask questions are re-embedded and re-retrieved
+in-process against the current indexes through the same pipeline as /ask
+(rag.pipeline, stopping before generation), reporting retrieval latency
+and how much of the logged chunk set comes back. With
+--url, every logged request (/ask, /summarize, /compare) is re-sent to a
+running API and end-to-end latency is compared.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import requests
+
+from rag.slow_log import read_log
+
+
+def _chunk_key(ref: dict):
+    if "chunk_id" in ref:
+        return ref["chunk_id"]
+    return (ref.get("collection"), ref.get("source"), ref.get("page"), ref.get("id"))
+
+
+def _logged_retrieval_ms(entry: dict):
+    timings = entry.get("timings") or {}
+    parts = [timings.get(k) for k in ("embed_ms", "search_ms", "mmr_ms")]
+    return round(sum(p for p in parts if p is not None), 1) if any(parts) else None
+
+
+def replay_retrieval(entries):
+    """Re-run retrieval of logged /ask entries in-process."""
+    from rag import pipeline
+    from rag.collection_store import CollectionStore
+    from rag.metrics import StageTimer
+    from rag.slow_log import chunk_refs
+
+    store = CollectionStore.load_all()
+
+    for entry in entries:
+        question = entry["request"].get("question", "")
+        result = {"ts": entry["ts"], "endpoint": "ask", "question": question}
+
+        # Summaries are API-only; questions answered from them had no retrieval
+        if entry.get("route") == "summary":
+            result["skipped"] = "answered from precomputed summaries"
+            yield result
+            continue
+
+        timer = StageTimer(trace=True)
+        try:
+            replayed = pipeline.ask(
+                store, question, filters=entry.get("filters"), retrieval_only=True, timer=timer
+            )
+        except (KeyError, pipeline.PipelineError) as e:
+            result["error"] = str(e.args[0])
+            yield result
+            continue
+        timings = timer.timings
+
+        old = entry.get("chunks") or []
+        new = chunk_refs(replayed["chunks"])
+        old_keys = {_chunk_key(c) for c in old}
+        new_keys = {_chunk_key(c) for c in new}
+
+        search_ms = timings.get("search_ms", 0.0) + timings.get("mmr_ms", 0.0)
+        result.update(
+            route=replayed["route"],
+            logged_route=entry.get("route"),
+            logged_ms=_logged_retrieval_ms(entry),
+            replay_ms=round(timings.get("embed_ms", 0.0) + search_ms, 1),
+            embed_ms=timings.get("embed_ms"),
+            search_ms=round(search_ms, 1),
+            overlap=round(len(old_keys & new_keys) / len(old_keys), 3) if old_keys else None,
+            same_top=bool(old and new and _chunk_key(old[0]) == _chunk_key(new[0])),
+            logged_top_score=old[0].get("score") if old else None,
+            replay_top_score=new[0].get("score") if new else None,
+            chunks=new,
+        )
+        yield result
+
+
+def replay_http(entries, url: str, timeout: float = 300):
+    """Re-send logged requests to a running API."""
+    session = requests.Session()
+
+    for n, entry in enumerate(entries):
+        endpoint = entry["endpoint"]
+        request = dict(entry["request"])
+        result = {"ts": entry["ts"], "endpoint": endpoint, "logged_ms": entry["latency_ms"]}
+
+        t0 = time.perf_counter()
+        if endpoint == "ask":
+            # Fresh session: replayed questions must not see each other
+            request.update(session_id=f"replay-{n}", timings=True)
+            r = session.post(f"{url}/ask", json=request, timeout=timeout)
+        elif endpoint == "summarize":
+            params = {k: v for k, v in request.items() if v is not None}
+            r = session.post(f"{url}/summarize", params=params, timeout=timeout)
+        else:
+            r = session.post(f"{url}/{endpoint}", json=request, timeout=timeout)
+        result["replay_ms"] = round(1000 * (time.perf_counter() - t0), 1)
+        result["status"] = r.status_code
+
+        if r.ok and endpoint == "ask":
+            body = r.json()
+            result.update(
+                route=body.get("route"),
+                logged_route=entry.get("route"),
+                gated=body.get("gated"),
+                timings=body.get("timings"),
+            )
+        yield result
+
+
+def summarize(results: list) -> dict:
+    done = [r for r in results if "replay_ms" in r]
+    summary = {
+        "entries": len(results),
+        "replayed": len(done),
+        "skipped_or_failed": len(results) - len(done),
+    }
+    if not done:
+        return summary
+
+    replay = np.array([r["replay_ms"] for r in done])
+    logged = np.array([r["logged_ms"] for r in done if r.get("logged_ms") is not None])
+    summary["replay_ms_p50"] = round(float(np.percentile(replay, 50)), 1)
+    summary["replay_ms_p95"] = round(float(np.percentile(replay, 95)), 1)
+    if len(logged):
+        summary["logged_ms_p50"] = round(float(np.percentile(logged, 50)), 1)
+        summary["logged_ms_p95"] = round(float(np.percentile(logged, 95)), 1)
+
+    overlaps = [r["overlap"] for r in done if r.get("overlap") is not None]
+    if overlaps:
+        summary["mean_overlap"] = round(float(np.mean(overlaps)), 3)
+        summary["top_changed"] = sum(1 for r in done if "same_top" in r and not r["same_top"])
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a slow-query log")
+    parser.add_argument("log", help="slow-query log (rotated files are read too)")
+    parser.add_argument("--url", help="replay against a running API instead of in-process retrieval")
+    parser.add_argument("--endpoint", choices=["ask", "summarize", "compare"], help="only this endpoint")
+    parser.add_argument("--limit", type=int, help="at most this many entries (most recent)")
+    parser.add_argument("--out", help="write one JSON result per entry to this file")
+    args = parser.parse_args()
+
+    entries = [
+        e for e in read_log(args.log)
+        if (args.endpoint is None or e["endpoint"] == args.endpoint)
+        and (args.url or e["endpoint"] == "ask")
+    ]
+    if args.limit:
+        entries = entries[-args.limit:]
+
+    results = []
+    replay = replay_http(entries, args.url.rstrip("/")) if args.url else replay_retrieval(entries)
+    for r in replay:
+        results.append(r)
+        line = f"[{r['endpoint']}] logged {r.get('logged_ms')} ms -> replay {r.get('replay_ms')} ms"
+        if "overlap" in r:
+            line += f", overlap {r['overlap']}, top {'same' if r['same_top'] else 'CHANGED'}"
+        if "skipped" in r or "error" in r:
+            line += f" ({r.get('skipped') or r.get('error')})"
+        print(line)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            for r in results:
+                f.write(json.dumps(r) + "\n")
+
+    print(json.dumps(summarize(results), indent=2))
@@ -20,9 +20,7 @@ if __name__ == "__main__":
     DIM = 768
     store = FaissVectorStore(dim=DIM)
 
-    for c in chunks:
-        emb = get_embedding(c["text"])
-        store.add(emb, c)
+    store.add_batch([get_embedding(c["text"]) for c in chunks], chunks)
 
     # 4. User question
     question = input("Enter your question: ").strip()
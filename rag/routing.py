@@ -0,0 +1,125 @@
+"""
+Routing of /ask questions by type (rag.question_type).
+
+Each route sets how much retrieval and generation a question gets:
+
+- "summary": served from precomputed per-paper summaries (rag.summaries),
+  no retrieval. Used when the question names its paper(s) or the selected
+  collections hold few papers; otherwise the question falls back to the
+  route named in "fallback".
+- "fact": few chunks, short answers.
+- "explanation": more chunks and a longer answer budget.
+
+Defaults are below; RAG_ROUTES may point to a JSON file overriding any of
+the keys per route, e.g. {"fact": {"top_k": 3, "num_predict": 96}}.
+"""
+import json
+import os
+import threading
+from collections import deque
+
+import numpy as np
+
+
+DEFAULT_ROUTES = {
+    "summary": {
+        "retrieve": False,
+        # Most papers answered from summaries before falling back
+        "max_papers": 3,
+        "fallback": "explanation",
+    },
+    "fact": {
+        "retrieve": True,
+        "top_k": 2,
+        "fetch_k": 8,
+        "context_tokens": 800,
+        "num_predict": 128,
+    },
+    "explanation": {
+        "retrieve": True,
+        "top_k": 5,
+        "fetch_k": 20,
+        "context_tokens": 2500,
+        "num_predict": 768,
+    },
+}
+
+# Latencies kept per route for percentiles
+_WINDOW = 1000
+
+
+def load_routes(path: str = None) -> dict:
+    """Default routing table, with per-route overrides from a JSON file."""
+    routes = {name: dict(cfg) for name, cfg in DEFAULT_ROUTES.items()}
+
+    path = path or os.getenv("RAG_ROUTES")
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            overrides = json.load(f)
+        for name, cfg in overrides.items():
+            routes.setdefault(name, {}).update(cfg)
+
+    return routes
+
+
+ROUTES = load_routes()
+
+
+class RouteStats:
+    """Thread-safe latency and token usage per route."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def record(self, route: str, latency_ms: float, usage: dict = None, cached: bool = None):
+        """
+        `usage` is generate_answer's usage dict, or a list of them when one
+        request made several generations.
+        """
+        usages = usage if isinstance(usage, list) else [usage or {}]
+        with self._lock:
+            s = self._routes.setdefault(route, {
+                "count": 0,
+                "latencies": deque(maxlen=_WINDOW),
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "generations": 0,
+                "cache_hits": 0,
+            })
+            s["count"] += 1
+            s["latencies"].append(latency_ms)
+            for u in usages:
+                if "eval_count" in u:
+                    s["generations"] += 1
+                    s["prompt_tokens"] += u.get("prompt_eval_count", 0)
+                    s["completion_tokens"] += u["eval_count"]
+            if cached:
+                s["cache_hits"] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            routes = {
+                name: {**s, "latencies": list(s["latencies"])}
+                for name, s in self._routes.items()
+            }
+
+        out = {}
+        for name, s in routes.items():
+            lat = np.asarray(s["latencies"])
+            gens = s["generations"]
+            out[name] = {
+                "count": s["count"],
+                "latency_ms": {
+                    "p50": round(float(np.percentile(lat, 50)), 1),
+                    "p95": round(float(np.percentile(lat, 95)), 1),
+                    "mean": round(float(lat.mean()), 1),
+                },
+                "generations": gens,
+                "prompt_tokens": s["prompt_tokens"],
+                "completion_tokens": s["completion_tokens"],
+                "mean_prompt_tokens": round(s["prompt_tokens"] / gens, 1) if gens else None,
+                "mean_completion_tokens": round(s["completion_tokens"] / gens, 1) if gens else None,
+                "cache_hits": s["cache_hits"],
+            }
+        return out
@@ -0,0 +1,131 @@
+"""
+Opt-in slow-query log: one JSON line per /ask, /summarize or /compare
+request that took at least RAG_SLOW_LOG_MS, written to RAG_SLOW_LOG
+(unset = off) and rotated at RAG_SLOW_LOG_MAX_BYTES.
+
+Each entry holds what is needed to understand and replay the request:
+
+    {
+        "ts": "2024-01-01T12:00:00+00:00",
+        "endpoint": "ask",
+        "latency_ms": 5321.4,
+        "request": {...},              # body / query params as received
+        "filters": {...},              # vector-store filters actually used
+        "route": "explanation",
+        "chunks": [{"collection", "id", "chunk_id", "source", "page", "score"}],
+        "prompt_tokens": 1830,         # Ollama's count, else estimated
+        "completion_tokens": 412,
+        "timings": {"embed_ms": ..., "search_ms": ..., "generate_ms": ...}
+    }
+
+Re-run logged queries against the current index with rag.replay.
+"""
+import glob
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+
+
+SLOW_LOG_PATH = os.getenv("RAG_SLOW_LOG", "")
+SLOW_LOG_MS = float(os.getenv("RAG_SLOW_LOG_MS", "2000"))
+SLOW_LOG_MAX_BYTES = int(os.getenv("RAG_SLOW_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+SLOW_LOG_BACKUPS = int(os.getenv("RAG_SLOW_LOG_BACKUPS", "5"))
+
+
+def chunk_refs(chunks) -> list:
+    """The identifying fields of retrieved chunks (no text or vectors)."""
+    refs = []
+    for c in chunks:
+        ref = {k: c[k] for k in ("collection", "id", "chunk_id", "source", "page") if k in c}
+        if "score" in c:
+            ref["score"] = round(float(c["score"]), 4)
+        refs.append(ref)
+    return refs
+
+
+class SlowQueryLog:
+    """
+    Args:
+        path (str): JSONL file; empty disables the log
+        threshold_ms (float): Requests faster than this are not logged
+        max_bytes (int): Rotate the file at this size...
+        backups (int): ...keeping this many old files (path.1, path.2, ...)
+    """
+
+    def __init__(
+        self,
+        path: str = SLOW_LOG_PATH,
+        threshold_ms: float = SLOW_LOG_MS,
+        max_bytes: int = SLOW_LOG_MAX_BYTES,
+        backups: int = SLOW_LOG_BACKUPS,
+    ):
+        self.path = path
+        self.threshold_ms = threshold_ms
+        self._logger = None
+
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            handler = RotatingFileHandler(
+                path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+
+            # Own logger per file, kept out of the "rag" stderr handler
+            self._logger = logging.getLogger(f"rag.slow_queries.{os.path.abspath(path)}")
+            self._logger.handlers = [handler]
+            self._logger.setLevel(logging.INFO)
+            self._logger.propagate = False
+
+    @property
+    def enabled(self) -> bool:
+        return self._logger is not None
+
+    def should_log(self, latency_ms: float) -> bool:
+        return self.enabled and latency_ms >= self.threshold_ms
+
+    def record(
+        self,
+        endpoint: str,
+        latency_ms: float,
+        request: dict,
+        chunks=(),
+        filters: dict = None,
+        route: str = None,
+        usage: dict = None,
+        context_tokens: int = None,
+        timings: dict = None,
+    ):
+        if not self.should_log(latency_ms):
+            return
+
+        usage = usage or {}
+        entry = {
+            "ts": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "endpoint": endpoint,
+            "latency_ms": round(latency_ms, 1),
+            "request": request,
+            "filters": filters,
+            "route": route,
+            "chunks": chunk_refs(chunks),
+            "prompt_tokens": usage.get("prompt_eval_count", context_tokens),
+            "completion_tokens": usage.get("eval_count"),
+            "timings": timings or {},
+        }
+        self._logger.info(json.dumps(entry, default=str))
+
+
+def read_log(path: str):
+    """Entries of a slow-query log, oldest rotated file first."""
+    rotated = [p for p in glob.glob(f"{glob.escape(path)}.*") if p.rsplit(".", 1)[-1].isdigit()]
+    rotated.sort(key=lambda p: -int(p.rsplit(".", 1)[-1]))
+
+    for p in rotated + [path]:
+        if not os.path.exists(p):
+            continue
+        with open(p, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
@@ -0,0 +1,147 @@
+"""
+Memory and recall report for the vector storage modes.
+
+Builds one store per mode in rag.vectorstore.STORAGE_MODES from the same
+vectors and compares them against exact flat search:
+
+    python -m rag.storage_report                 # synthetic 20k x 768 corpus
+    python -m rag.storage_report --from-index    # vectors from rag/index
+    python -m rag.storage_report --prefix-dims 64 128 256
+
+"prefix" storage is reported once per --prefix-dims value. Synthetic
+vectors spread information evenly over all dimensions, so their prefix
+recall is a lower bound; use --from-index to measure real (Matryoshka)
+embeddings.
+
+Reported per mode:
+- index bytes/chunk: resident size of the FAISS index
+- side bytes/chunk: exact vectors in the memory-mapped side file
+  (paged in on demand, only the shortlist is touched per query)
+- recall@k first stage: quantized search alone vs exact top-k
+- recall@k re-ranked: after exact re-scoring of the shortlist
+- ms/query: search including re-scoring, vs exact flat search
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+from rag.vectorstore import FaissVectorStore, STORAGE_MODES
+
+
+INDEX_DIR = "rag/index"
+FAISS_PATH = f"{INDEX_DIR}/faiss.index"
+
+
+def synthetic_vectors(n: int, dim: int = 768, clusters: int = 200, seed: int = 0) -> np.ndarray:
+    """
+    Clustered unit vectors: papers cover a few topics, so real chunk
+    embeddings are far from uniform on the sphere.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype("float32")
+    labels = rng.integers(0, clusters, n)
+    vectors = centers[labels] + 0.6 * rng.standard_normal((n, dim)).astype("float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def saved_vectors(path: str = FAISS_PATH) -> np.ndarray:
+    index = faiss.read_index(path)
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def _recall(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def _layouts(prefix_dims):
+    for mode in STORAGE_MODES:
+        if mode == "prefix":
+            for dims in prefix_dims:
+                yield f"prefix{dims}", mode, dims
+        else:
+            yield mode, mode, None
+
+
+def report(vectors: np.ndarray, queries: np.ndarray, k: int = 10, rerank_factor: int = None,
+           prefix_dims=(128, 256)):
+    n, dim = vectors.shape
+    metas = [{"text": "", "source": "", "page": i} for i in range(n)]
+
+    exact = FaissVectorStore(dim)
+    exact.add_batch(vectors, metas)
+    _, truth = exact.index.search(queries, k)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, mode, dims in _layouts(prefix_dims):
+            store = FaissVectorStore(
+                dim, storage=mode,
+                vectors_path=os.path.join(tmp, f"{label}.f32"),
+                rerank_factor=rerank_factor,
+                prefix_dims=dims or 0,
+            )
+            store.add_batch(vectors, metas)
+            snap = store.snapshot()
+
+            _, first = snap.index.search(store._first_stage(queries), k)
+
+            t0 = time.perf_counter()
+            reranked = np.array([
+                [r["page"] for r in store.search(q, top_k=k)] for q in queries
+            ])
+            ms = 1000 * (time.perf_counter() - t0) / len(queries)
+
+            index_bytes = faiss.serialize_index(snap.index).nbytes
+            side_bytes = 0 if snap.vectors is None else snap.vectors.nbytes
+
+            rows.append({
+                "mode": label,
+                "index_bytes_per_chunk": index_bytes / n,
+                "side_bytes_per_chunk": side_bytes / n,
+                "recall_first_stage": _recall(first, truth),
+                "recall_reranked": _recall(reranked, truth),
+                "search_ms": ms,
+            })
+
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--from-index", action="store_true", help="use vectors from rag/index")
+    parser.add_argument("-n", type=int, default=20000, help="synthetic corpus size")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--rerank-factor", type=int, help="default: per storage mode")
+    parser.add_argument("--prefix-dims", type=int, nargs="+", default=[128, 256],
+                        help="first-stage dimensions for prefix storage (default: %(default)s)")
+    args = parser.parse_args()
+
+    vectors = saved_vectors() if args.from_index else synthetic_vectors(args.n)
+
+    # Queries: perturbed copies of stored chunks
+    rng = np.random.default_rng(1)
+    picks = rng.integers(0, len(vectors), args.queries)
+    queries = vectors[picks] + 0.05 * rng.standard_normal((args.queries, vectors.shape[1]))
+    queries = (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype("float32")
+
+    k = min(args.k, len(vectors))
+    print(f"{len(vectors)} chunks x {vectors.shape[1]} dims, recall@{k}, "
+          f"rerank factor {args.rerank_factor or 'per mode'}\n")
+    print(f"{'mode':<9} {'index B/chunk':>14} {'side B/chunk':>13} "
+          f"{'recall 1st':>11} {'recall rerank':>14} {'ms/query':>9}")
+
+    for r in report(vectors, queries, k, args.rerank_factor, args.prefix_dims):
+        print(
+            f"{r['mode']:<9} {r['index_bytes_per_chunk']:>14.0f} {r['side_bytes_per_chunk']:>13.0f} "
+            f"{r['recall_first_stage']:>11.3f} {r['recall_reranked']:>14.3f} {r['search_ms']:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
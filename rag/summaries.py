@@ -0,0 +1,135 @@
+"""
+Precomputed per-paper summaries, served by the "summary" route of /ask.
+
+Summaries are stored per collection next to its index (summaries.json),
+keyed by paper and role:
+
+    {"paper.pdf": {"key": "<hash of the summarized text>", "roles": {"student": "..."}}}
+
+The key is a hash of the text the summary was generated from, so a paper
+that is re-uploaded or re-indexed with new content gets a fresh summary.
+Missing summaries are generated on first use; run
+
+    python -m rag.summaries [--collection NAME] [--roles student researcher]
+
+to precompute them for every paper.
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+
+from rag.collection_store import (
+    CollectionStore,
+    DEFAULT_COLLECTION,
+    summaries_path,
+)
+from rag.generator import generate_answer
+
+
+# Leading chunks of a paper the summary is generated from
+SUMMARY_CHUNKS = 8
+
+SUMMARY_PROMPT = (
+    "Provide a structured summary including:\n"
+    "- Problem statement\n"
+    "- Methods\n"
+    "- Contributions\n"
+    "- Conclusions"
+)
+
+
+def summary_context(chunks) -> str:
+    return "\n\n".join(
+        f"[{c['source']} | page {c['page']}]\n{c['text']}"
+        for c in chunks[:SUMMARY_CHUNKS]
+    )
+
+
+class SummaryCache:
+    """
+    Args:
+        generate (callable): generate_answer-compatible function used for
+            missing summaries
+    """
+
+    def __init__(self, generate=generate_answer):
+        self.generate = generate
+        self._lock = threading.Lock()
+        self._collections = {}
+
+    def _load(self, collection: str) -> dict:
+        summaries = self._collections.get(collection)
+        if summaries is None:
+            path = summaries_path(collection)
+            summaries = {}
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    summaries = json.load(f)
+            self._collections[collection] = summaries
+        return summaries
+
+    def _save(self, collection: str):
+        path = summaries_path(collection)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._collections[collection], f, indent=1, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    def get(self, collection: str, source: str, chunks, role: str = "student", usage: dict = None):
+        """
+        Summary of one paper (its chunks in document order). Returns
+        (summary, cached); generated and persisted if missing or stale.
+        `usage` collects the generation's token counts, as in generate_answer.
+        """
+        context = summary_context(chunks)
+        key = hashlib.sha256(context.encode("utf-8")).hexdigest()[:16]
+
+        with self._lock:
+            entry = self._load(collection).get(source)
+            if entry and entry["key"] == key and role in entry["roles"]:
+                return entry["roles"][role], True
+
+        # Generate outside the lock; concurrent misses may both generate
+        options = {} if usage is None else {"usage": usage}
+        summary = self.generate(
+            context=context, question=SUMMARY_PROMPT, mode="summarize", role=role, **options
+        )
+        if summary.startswith("[Generation error]"):
+            return summary, False
+
+        with self._lock:
+            summaries = self._load(collection)
+            entry = summaries.get(source)
+            if not entry or entry["key"] != key:
+                entry = summaries[source] = {"key": key, "roles": {}}
+            entry["roles"][role] = summary
+            self._save(collection)
+
+        return summary, False
+
+
+def precompute(collection: str = DEFAULT_COLLECTION, roles=("student",)):
+    store = CollectionStore.load_all()
+    cache = SummaryCache()
+
+    for name, source in store.papers([collection]):
+        chunks = store.paper_chunks(name, source)
+        for role in roles:
+            _, cached = cache.get(name, source, chunks, role)
+            print(f"{source} [{role}]: {'cached' if cached else 'generated'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute per-paper summaries")
+    parser.add_argument(
+        "--collection", default=DEFAULT_COLLECTION,
+        help="collection to summarize (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--roles", nargs="+", default=["student"],
+        help="roles to precompute (default: %(default)s)",
+    )
+    args = parser.parse_args()
+    precompute(args.collection, args.roles)
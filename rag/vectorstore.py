@@ -1,38 +1,703 @@
+import os
+import pickle
+import tempfile
+import threading
+import time
+
 import faiss
 import numpy as np
 
 
+# First-stage index layouts. "flat" keeps exact float32 vectors in FAISS;
+# the quantized modes keep compressed codes in FAISS and the exact vectors in
+# a memory-mapped side file used to re-score the shortlist and for MMR.
+# "prefix" is the same two-stage layout with a float32 index over only the
+# first `prefix_dims` dimensions of each vector, renormalized (Matryoshka
+# embeddings such as nomic-embed-text v1.5 keep most of their quality
+# when truncated).
+STORAGE_MODES = ("flat", "sq8", "fp16", "prefix")
+
+DEFAULT_PREFIX_DIMS = 256
+
+# Shortlist size (x top_k) re-scored against the exact vectors. Truncation
+# loses more ranking quality than quantization, so prefix storage fetches more.
+DEFAULT_RERANK_FACTOR = 4
+PREFIX_RERANK_FACTOR = 16
+
+# SQ8 ranges are re-learned from all exact vectors on every publish until the
+# store holds this many rows, so a tiny first upload does not fix them.
+SQ8_RETRAIN_ROWS = 10000
+
+# Reads of a saved index retried while concurrent saves replace it
+LOAD_ATTEMPTS = 5
+
+_SQ_TYPES = {
+    "sq8": faiss.ScalarQuantizer.QT_8bit,
+    "fp16": faiss.ScalarQuantizer.QT_fp16,
+}
+
+
 def cosine_sim(a, b):
     return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
 
 
+def mmr_select(query_embedding, candidates, top_k=3, lambda_mult=0.5):
+    """
+    Pick `top_k` of `candidates` (dicts with an "embedding") by Maximal
+    Marginal Relevance against a normalized query.
+    """
+    candidates = list(candidates)
+    selected = []
+
+    while len(selected) < top_k and candidates:
+        best_idx = -1
+        best_score = -1
+
+        for i, c in enumerate(candidates):
+            relevance = cosine_sim(query_embedding, c["embedding"])
+
+            diversity = 0
+            if selected:
+                diversity = max(
+                    cosine_sim(c["embedding"], s["embedding"])
+                    for s in selected
+                )
+
+            mmr_score = lambda_mult * relevance - (1 - lambda_mult) * diversity
+
+            if mmr_score > best_score:
+                best_score = mmr_score
+                best_idx = i
+
+        selected.append(candidates[best_idx])
+        candidates.pop(best_idx)   # ✅ SAFE removal
+
+    return selected
+
+
+def mmr_select_batch(query_embeddings, candidate_lists, top_k=3, lambda_mult=0.5):
+    """
+    `mmr_select` for many queries. Relevance and pairwise similarities are
+    computed as matrix products per query instead of pair by pair; the
+    greedy picks are the same.
+    """
+    results = []
+    for query, candidates in zip(query_embeddings, candidate_lists):
+        if not candidates:
+            results.append([])
+            continue
+
+        emb = np.stack([c["embedding"] for c in candidates]).astype("float32")
+        emb /= np.linalg.norm(emb, axis=1, keepdims=True)
+        relevance = emb @ (query / np.linalg.norm(query))
+        pairwise = emb @ emb.T
+
+        picked = []
+        # Max similarity to anything picked so far (0 before the first pick)
+        diversity = np.zeros(len(candidates), dtype="float32")
+        available = np.ones(len(candidates), dtype=bool)
+
+        while len(picked) < top_k and available.any():
+            scores = lambda_mult * relevance - (1 - lambda_mult) * diversity
+            scores[~available] = -np.inf
+            best = int(np.argmax(scores))
+
+            diversity = pairwise[best] if not picked else np.maximum(diversity, pairwise[best])
+            picked.append(best)
+            available[best] = False
+
+        results.append([candidates[i] for i in picked])
+
+    return results
+
+
+def _normalize_rows(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype="float32")
+    vectors = vectors.reshape(-1, vectors.shape[-1])
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _prefix_rows(vectors, dims: int) -> np.ndarray:
+    """Leading `dims` dimensions of each row, renormalized to unit length."""
+    return np.ascontiguousarray(_normalize_rows(np.asarray(vectors)[..., :dims]))
+
+
+def _make_index(dim: int, storage: str, prefix_dims: int = DEFAULT_PREFIX_DIMS):
+    if storage == "flat":
+        return faiss.IndexFlatIP(dim)
+    if storage == "prefix":
+        if not 0 < prefix_dims < dim:
+            raise ValueError(f"prefix_dims must be between 1 and {dim - 1}, got {prefix_dims}")
+        return faiss.IndexFlatIP(prefix_dims)
+    if storage not in _SQ_TYPES:
+        raise ValueError(f"Unknown storage mode {storage!r}, expected one of {STORAGE_MODES}")
+
+    index = faiss.IndexScalarQuantizer(dim, _SQ_TYPES[storage], faiss.METRIC_INNER_PRODUCT)
+    # Widen the learned per-dimension ranges a bit so papers added after the
+    # last retrain are not clipped as hard.
+    index.sq.rangestat = faiss.ScalarQuantizer.RS_minmax
+    index.sq.rangestat_arg = 0.1
+    return index
+
+
+def _storage_of(index, dim: int) -> str:
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        for name, qtype in _SQ_TYPES.items():
+            if index.sq.qtype == qtype:
+                return name
+    if index.d < dim:
+        return "prefix"
+    return "flat"
+
+
+# mkstemp creates files readable by their owner only; saved files should get
+# the usual permissions. Read once at import, before any threads start.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def _temp_file(path: str):
+    """Create a uniquely named temp file next to `path`; returns (fd, name)."""
+    fd, name = tempfile.mkstemp(
+        dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp"
+    )
+    os.fchmod(fd, 0o666 & ~_UMASK)
+    return fd, name
+
+
+def _open_writable(path: str):
+    """Open for in-place appends if allowed, else read-only."""
+    try:
+        return open(path, "r+b")
+    except PermissionError:
+        return open(path, "rb")
+
+
+def _open_committed(path: str, temp_name: str, ino: int, writable: bool = False):
+    """
+    Open the file a save's commit record names (by inode): at `path`, or
+    still under its temp name if that save was interrupted before renaming
+    it. Returns (file, name it was found under), or (None, None) when
+    neither holds it any more, i.e. a newer save replaced it.
+    """
+    temp_path = os.path.join(os.path.dirname(path), temp_name)
+    for name in (path, temp_path):
+        try:
+            f = _open_writable(name) if writable else open(name, "rb")
+        except FileNotFoundError:
+            continue
+        if os.fstat(f.fileno()).st_ino == ino:
+            return f, name
+        f.close()
+    return None, None
+
+
+def _finish_rename(name: str, path: str):
+    """Complete an interrupted save's rename of `name` over `path`."""
+    if name != path:
+        try:
+            os.replace(name, path)
+        except OSError:
+            pass  # the saver (or another loader) got there first
+
+
+class _Snapshot:
+    """
+    Immutable view of the store: a FAISS index plus the metadata rows that
+    belong to it. Published snapshots are never mutated, so readers can use
+    one without any locking.
+
+    Filter columns are derived from the metadata when the snapshot is built:
+    `paper_ranges` maps each source to its contiguous [start, end) id runs,
+    `pages` and `uploaded_at` are per-row arrays (NaN when a row has no
+    upload date).
+    """
+    __slots__ = ("index", "metadata", "vectors", "version",
+                 "paper_ranges", "pages", "uploaded_at")
+
+    def __init__(self, index, metadata: tuple, version: int, vectors=None, base=None):
+        self.index = index
+        self.metadata = metadata
+        # Exact float32 rows for two-stage storage (None for "flat")
+        self.vectors = vectors
+        self.version = version
+        self._build_columns(base)
+
+    def _build_columns(self, base):
+        # Extend the previous snapshot's columns when this one only appends
+        # rows to it, instead of rescanning the whole corpus.
+        if base is None:
+            start, ranges = 0, {}
+            pages = np.empty(0, dtype="int32")
+            uploaded = np.empty(0, dtype="float64")
+        else:
+            start = len(base.metadata)
+            ranges = {src: list(runs) for src, runs in base.paper_ranges.items()}
+            pages, uploaded = base.pages, base.uploaded_at
+
+        new = self.metadata[start:]
+        for i, meta in enumerate(new, start):
+            runs = ranges.setdefault(meta["source"], [])
+            if runs and runs[-1][1] == i:
+                runs[-1] = (runs[-1][0], i + 1)
+            else:
+                runs.append((i, i + 1))
+
+        self.paper_ranges = ranges
+        self.pages = np.concatenate([
+            pages, np.array([m.get("page", 0) for m in new], dtype="int32")
+        ])
+        self.uploaded_at = np.concatenate([
+            uploaded, np.array([m.get("uploaded_at", np.nan) for m in new], dtype="float64")
+        ])
+
+
 class FaissVectorStore:
-    def __init__(self, dim: int):
+    def __init__(
+        self,
+        dim: int,
+        storage: str = "flat",
+        vectors_path: str = None,
+        rerank_factor: int = None,
+        prefix_dims: int = DEFAULT_PREFIX_DIMS,
+    ):
+        """
+        Args:
+            dim (int): Embedding dimension
+            storage (str): One of STORAGE_MODES for the first-stage index
+            vectors_path (str): Side file for exact vectors in two-stage
+                modes. If None they are kept in RAM instead.
+            rerank_factor (int): Two-stage modes shortlist
+                `top_k * rerank_factor` candidates before exact re-scoring
+                (default depends on the storage mode)
+            prefix_dims (int): Dimensions kept in the first-stage index of
+                "prefix" storage
+        """
         self.dim = dim
-        self.index = faiss.IndexFlatIP(dim)
-        self.metadata = []
+        self.storage = storage
+        self.vectors_path = vectors_path
+        self._rerank_factor = rerank_factor
+        self.prefix_dims = prefix_dims
+
+        index = _make_index(dim, storage, prefix_dims)
+        vectors = None if storage == "flat" else np.empty((0, dim), dtype="float32")
+        self._snapshot = _Snapshot(index, (), 0, vectors)
+        # Serializes writers only; readers never take it.
+        self._write_lock = threading.Lock()
+        # Serializes saves, which must not block writers for their duration
+        self._save_lock = threading.Lock()
+
+        # Open handle on the side file this store writes and maps, and its
+        # current name: `vectors_path` once loaded or saved, a private temp
+        # file before that. Snapshots map the handle, not the path, so they
+        # keep working when the path is replaced.
+        self._vectors_file = None
+        self._vectors_name = None
+        # Private file named by a save's commit record but not yet renamed
+        # over `vectors_path`; it must not be unlinked until it is.
+        self._pinned_vectors = None
+
+    @property
+    def rerank_factor(self) -> int:
+        # Follows the storage mode, which `load` may change
+        if self._rerank_factor is not None:
+            return self._rerank_factor
+        return PREFIX_RERANK_FACTOR if self.storage == "prefix" else DEFAULT_RERANK_FACTOR
+
+    # -----------------------------
+    # Snapshot access
+    # -----------------------------
+    def snapshot(self) -> _Snapshot:
+        """
+        Return the current published snapshot. Callers that need several
+        reads to agree with each other should grab one and reuse it.
+        """
+        return self._snapshot
+
+    @property
+    def index(self):
+        return self._snapshot.index
+
+    @property
+    def metadata(self) -> tuple:
+        return self._snapshot.metadata
 
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    def _publish(self, index, metadata: tuple, vectors=None, base=None):
+        # A single attribute assignment is atomic, so readers see either the
+        # old snapshot or the new one, never a mix of the two.
+        self._snapshot = _Snapshot(
+            index, metadata, self._snapshot.version + 1, vectors, base
+        )
+
+    def _map_vectors(self, n: int):
+        if n == 0:
+            return np.empty((0, self.dim), dtype="float32")
+        return np.memmap(self._vectors_file, dtype="float32", mode="r", shape=(n, self.dim))
+
+    def _new_vectors_file(self, blocks):
+        """
+        Write `blocks` of rows to a new private side file and make it the
+        one this store appends to. Files other stores or processes may map
+        are never truncated or rewritten; `save` renames the private file
+        over `vectors_path` once its commit record is in place.
+        """
+        fd, name = _temp_file(self.vectors_path)
+        f = os.fdopen(fd, "w+b")
+        for block in blocks:
+            for start in range(0, len(block), 65536):
+                f.write(np.ascontiguousarray(block[start:start + 65536], dtype="float32").tobytes())
+        f.flush()
+
+        old_file, old_name = self._vectors_file, self._vectors_name
+        self._vectors_file, self._vectors_name = f, name
+        if old_file is not None:
+            # Existing snapshots keep their own mappings of the old file
+            old_file.close()
+        if old_name not in (None, self.vectors_path, self._pinned_vectors):
+            os.unlink(old_name)
+
+    def _write_vectors(self, current, vectors: np.ndarray):
+        """
+        Extend the exact-vector store with new rows and return the array for
+        the next snapshot. Rows are appended in place only when the side
+        file ends exactly at the current snapshot's last row; otherwise (a
+        fresh store, or rows past ours that another mapping may cover) the
+        rows go to a new private file.
+        """
+        start = len(current.metadata)
+
+        if self.vectors_path is None:
+            return np.concatenate([current.vectors, vectors])
+
+        f = self._vectors_file
+        row_bytes = self.dim * 4
+        if f is not None and f.writable() and os.fstat(f.fileno()).st_size == start * row_bytes:
+            f.seek(start * row_bytes)
+            f.write(vectors.tobytes())
+            f.flush()
+        else:
+            self._new_vectors_file([current.vectors, vectors])
+
+        return self._map_vectors(start + len(vectors))
+
+    def _pin_vectors(self):
+        """
+        Side file holding the current snapshot's rows, for a save's commit
+        record: (name, inode). A private file is pinned until `save` has
+        renamed it over `vectors_path`. Called under the write lock.
+        """
+        f = self._vectors_file
+        if f is None:
+            # Nothing written yet: save an empty file for `load` to find
+            self._new_vectors_file([])
+        elif self._vectors_name == self.vectors_path and not (
+            os.path.exists(self.vectors_path)
+            and os.path.samestat(os.stat(self.vectors_path), os.fstat(f.fileno()))
+        ):
+            # Another store replaced the file since we loaded or saved it
+            self._new_vectors_file([self._snapshot.vectors])
+
+        if self._vectors_name != self.vectors_path:
+            self._pinned_vectors = self._vectors_name
+        return os.path.basename(self._vectors_name), os.fstat(self._vectors_file.fileno()).st_ino
+
+    def _unpin_vectors(self, committed: bool):
+        """Rename the pinned file into place, or drop it if its save failed."""
+        with self._write_lock:
+            pinned, self._pinned_vectors = self._pinned_vectors, None
+            if pinned is None:
+                return
+            if committed:
+                _finish_rename(pinned, self.vectors_path)
+                if self._vectors_name == pinned:
+                    self._vectors_name = self.vectors_path
+            elif self._vectors_name != pinned:
+                os.unlink(pinned)
+
+    # -----------------------------
+    # Writes
+    # -----------------------------
     def add(self, embedding: np.ndarray, meta: dict):
-        embedding = embedding / np.linalg.norm(embedding)
-        self.index.add(embedding.reshape(1, -1))
-        self.metadata.append(meta)
+        self.add_batch([embedding], [meta])
+
+    def add_batch(self, embeddings, metas, copy: bool = True):
+        """
+        Add several embeddings at once and publish them as one snapshot.
+
+        The new rows are added to a private copy of the current index, so
+        searches running against the previous snapshot are never disturbed.
+        Prefer this over repeated `add` calls: every publish copies the index.
+
+        `copy=False` adds to the current index in place instead. Only use it
+        when nothing else is searching this store (e.g. an offline ingest),
+        as it skips the per-publish copy.
+        """
+        metas = list(metas)
+        if not metas:
+            return
+
+        vectors = self._unit_rows(embeddings, len(metas))
+        with self._write_lock:
+            current = self._snapshot
+            self._publish(*self._appended(current, vectors, metas, copy), base=current)
+
+    def replace_sources(self, sources, embeddings, metas) -> int:
+        """
+        Remove every chunk of the given papers and add `metas` in their
+        place as one snapshot, so concurrent searches see either the old
+        chunks or the new ones, never neither. Returns rows removed.
+        """
+        metas = list(metas)
+        vectors = self._unit_rows(embeddings, len(metas)) if metas else None
+
+        with self._write_lock:
+            current = self._snapshot
+            ids = self._source_ids(current, sources)
+            if not len(ids):
+                if metas:
+                    self._publish(*self._appended(current, vectors, metas, copy=True), base=current)
+                return 0
 
-    def search(self, query_embedding, top_k=3):
+            index, metadata, exact = self._removed(current, ids)
+            if metas:
+                # Unpublished intermediate; its index is already a private copy
+                current = _Snapshot(index, metadata, current.version, exact)
+                index, metadata, exact = self._appended(current, vectors, metas, copy=False)
+            self._publish(index, metadata, exact, base=current if metas else None)
+
+        return len(ids)
+
+    def _unit_rows(self, embeddings, n: int) -> np.ndarray:
+        vectors = np.asarray(embeddings, dtype="float32").reshape(n, -1)
+        vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        return np.ascontiguousarray(vectors, dtype="float32")
+
+    def _appended(self, current, vectors: np.ndarray, metas: list, copy: bool):
+        """(index, metadata, vectors) of `current` plus new rows (under the write lock)."""
+        exact = None
+        if current.vectors is not None:
+            exact = self._write_vectors(current, vectors)
+
+        if self.storage == "sq8" and (
+            not current.index.is_trained or len(exact) <= SQ8_RETRAIN_ROWS
+        ):
+            staging = _make_index(self.dim, self.storage)
+            all_vectors = np.ascontiguousarray(exact)
+            staging.train(all_vectors)
+            staging.add(all_vectors)
+        else:
+            staging = faiss.clone_index(current.index) if copy else current.index
+            staging.add(self._first_stage(vectors))
+
+        return staging, current.metadata + tuple(metas), exact
+
+    def _removed(self, current, ids: np.ndarray):
+        """(index, metadata, vectors) of `current` without `ids` (under the write lock)."""
+        keep = np.ones(len(current.metadata), dtype=bool)
+        keep[ids] = False
+
+        staging = faiss.clone_index(current.index)
+        staging.remove_ids(faiss.IDSelectorBatch(ids))
+        metadata = tuple(m for m, k in zip(current.metadata, keep) if k)
+
+        exact = None
+        if current.vectors is not None:
+            exact = self._compact_vectors(current.vectors[keep])
+
+        return staging, metadata, exact
+
+    @staticmethod
+    def _source_ids(snap, sources) -> np.ndarray:
+        runs = [r for src in sources for r in snap.paper_ranges.get(src, ())]
+        if not runs:
+            return np.empty(0, dtype="int64")
+        return np.concatenate([np.arange(a, b, dtype="int64") for a, b in runs])
+
+    def remove_ids(self, ids):
+        """
+        Remove rows by id and publish the compacted store as one snapshot.
+
+        FAISS compacts the index in place, so the remaining rows keep their
+        order but ids after a removed row shift down; metadata and exact
+        vectors are compacted the same way. Ids are only stable within one
+        snapshot.
+        """
+        ids = np.unique(np.asarray(ids, dtype="int64"))
+        if len(ids) == 0:
+            return 0
+
+        with self._write_lock:
+            self._publish(*self._removed(self._snapshot, ids))
+
+        return len(ids)
+
+    def remove_sources(self, sources) -> int:
+        """Remove every chunk of the given papers. Returns rows removed."""
+        return self.replace_sources(sources, [], [])
+
+    def _compact_vectors(self, kept: np.ndarray):
+        if self.vectors_path is None:
+            return kept
+
+        # A new file: snapshots still mapping the old one keep reading it
+        self._new_vectors_file([kept])
+        return self._map_vectors(len(kept))
+
+    # -----------------------------
+    # Filters
+    # -----------------------------
+    def _filter_ids(self, snap, filters: dict):
+        """
+        Resolve a filter dict to the sorted array of matching row ids.
+
+        Supported keys (all optional, combined with AND):
+            sources (list[str]): paper file names
+            pages (list[tuple[int, int]]): inclusive page ranges
+            uploaded_after / uploaded_before (float): epoch seconds;
+                rows without an upload date never match these
+        """
+        sources = filters.get("sources")
+        if sources:
+            runs = [r for src in sources for r in snap.paper_ranges.get(src, ())]
+            if not runs:
+                return np.empty(0, dtype="int64")
+            ids = np.concatenate([np.arange(a, b, dtype="int64") for a, b in sorted(runs)])
+        else:
+            ids = np.arange(len(snap.metadata), dtype="int64")
+
+        keep = np.ones(len(ids), dtype=bool)
+
+        page_ranges = filters.get("pages")
+        if page_ranges:
+            pages = snap.pages[ids]
+            in_pages = np.zeros(len(ids), dtype=bool)
+            for lo, hi in page_ranges:
+                in_pages |= (pages >= lo) & (pages <= hi)
+            keep &= in_pages
+
+        after, before = filters.get("uploaded_after"), filters.get("uploaded_before")
+        if after is not None or before is not None:
+            uploaded = snap.uploaded_at[ids]
+            # NaN comparisons are False, so undated rows drop out here
+            if after is not None:
+                keep &= uploaded >= after
+            if before is not None:
+                keep &= uploaded <= before
+
+        return ids[keep]
+
+    def _search_params(self, snap, filters: dict):
+        """
+        Build FAISS search parameters restricting the search to the rows
+        matching `filters`. Returns (params, n_matching); params is None when
+        there is nothing to filter.
+        """
+        if not filters:
+            return None, len(snap.metadata)
+
+        ids = self._filter_ids(snap, filters)
+        if len(ids) == 0:
+            return None, 0
+
+        # A single contiguous run (one paper, no page/date filter) is the
+        # common case and the cheapest selector to test.
+        if ids[-1] - ids[0] + 1 == len(ids):
+            selector = faiss.IDSelectorRange(int(ids[0]), int(ids[-1]) + 1)
+        else:
+            selector = faiss.IDSelectorBatch(ids)
+
+        return faiss.SearchParameters(sel=selector), len(ids)
+
+    def count(self, filters: dict = None) -> int:
+        """Number of rows in the current snapshot matching `filters`."""
+        snap = self._snapshot
+        if not filters:
+            return len(snap.metadata)
+        return len(self._filter_ids(snap, filters))
+
+    # -----------------------------
+    # Reads
+    # -----------------------------
+    def _shortlist_batch(self, snap, queries, k, filters=None):
+        """
+        First-stage search for a matrix of normalized queries, as one FAISS
+        call. Returns a list of (scores, ids) per query, best first.
+
+        For quantized and prefix storage the compressed (or truncated) index
+        over-fetches `k * rerank_factor` candidates, which are then
+        re-scored exactly against the full-precision vectors.
+        """
+        queries = np.ascontiguousarray(queries, dtype="float32").reshape(-1, self.dim)
+
+        params, matching = self._search_params(snap, filters)
+        if matching == 0:
+            empty = (np.empty(0, dtype="float32"), np.empty(0, dtype="int64"))
+            return [empty] * len(queries)
+        # FAISS allocates k results per query up front, whatever the index size
+        k = min(k, matching)
+
+        if snap.vectors is None:
+            distances, indices = snap.index.search(queries, k, params=params)
+            keep = indices != -1
+            return [(d[m], i[m]) for d, i, m in zip(distances, indices, keep)]
+
+        _, indices = snap.index.search(self._first_stage(queries), k * self.rerank_factor, params=params)
+        shortlists = []
+        for query, row in zip(queries, indices):
+            ids = row[row != -1]
+            exact = snap.vectors[ids] @ query
+            order = np.argsort(-exact)[:k]
+            shortlists.append((exact[order], ids[order]))
+        return shortlists
+
+    def _first_stage(self, vectors):
+        """Rows as the first-stage index stores them (prefixes for "prefix")."""
+        if self.storage == "prefix":
+            return _prefix_rows(vectors, self.prefix_dims)
+        return vectors
+
+    def _shortlist(self, snap, query_embedding, k, filters=None):
+        return self._shortlist_batch(snap, query_embedding.reshape(1, -1), k, filters)[0]
+
+    def _embedding(self, snap, idx: int) -> np.ndarray:
+        if snap.vectors is None:
+            return snap.index.reconstruct(idx)
+        return np.asarray(snap.vectors[idx])
+
+    def paper_vectors(self, source: str):
+        """
+        Metadata and exact (normalized) vectors of one paper's rows, in
+        document order and taken from a single snapshot.
+        """
+        snap = self._snapshot
+        runs = snap.paper_ranges.get(source, ())
+        if not runs:
+            return [], np.empty((0, self.dim), dtype="float32")
+
+        if snap.vectors is None:
+            blocks = [snap.index.reconstruct_n(a, b - a) for a, b in runs]
+        else:
+            blocks = [np.asarray(snap.vectors[a:b]) for a, b in runs]
+        metadata = [snap.metadata[i] for a, b in runs for i in range(a, b)]
+        return metadata, np.vstack(blocks)
+
+    def search(self, query_embedding, top_k=3, filters: dict = None):
+        snap = self._snapshot
         query_embedding = query_embedding / np.linalg.norm(query_embedding)
 
-        distances, indices = self.index.search(
-            query_embedding.reshape(1, -1), top_k
-        )
+        distances, indices = self._shortlist(snap, query_embedding, top_k, filters)
 
         results = []
-        for score, idx in zip(distances[0], indices[0]):
-            if idx == -1:
-                continue
-
+        for score, idx in zip(distances, indices):
             idx = int(idx)
-            chunk = self.metadata[idx]
+            chunk = snap.metadata[idx]
 
             results.append({
+                "id": idx,
                 "text": chunk["text"],
                 "source": chunk["source"],
                 "page": chunk["page"],
@@ -41,60 +706,351 @@ class FaissVectorStore:
 
         return results
 
-    def search_mmr(self, query_embedding, top_k=3, fetch_k=10, lambda_mult=0.5):
-        query_embedding = query_embedding / np.linalg.norm(query_embedding)
+    def mmr_candidates(self, query_embedding, fetch_k=10, filters: dict = None):
+        """
+        Shortlist for MMR: the `fetch_k` best rows with their exact
+        embeddings. `query_embedding` must already be normalized.
+        """
+        snap = self._snapshot
+        distances, indices = self._shortlist(snap, query_embedding, fetch_k, filters)
+        return self._candidates(snap, distances, indices)
 
-        distances, indices = self.index.search(
-            query_embedding.reshape(1, -1), fetch_k
-        )
+    def mmr_candidates_batch(self, queries, fetch_k=10, filters: dict = None):
+        """`mmr_candidates` for a matrix of normalized queries, one FAISS call."""
+        snap = self._snapshot
+        return [
+            self._candidates(snap, distances, indices)
+            for distances, indices in self._shortlist_batch(snap, queries, fetch_k, filters)
+        ]
 
+    def _candidates(self, snap, distances, indices):
         candidates = []
-        for score, idx in zip(distances[0], indices[0]):
-            if idx == -1:
-                continue
-
+        for score, idx in zip(distances, indices):
             idx = int(idx)
-            meta = self.metadata[idx]
+            meta = snap.metadata[idx]
 
             candidates.append({
-                "embedding": self.index.reconstruct(idx),
+                "id": idx,
+                "embedding": self._embedding(snap, idx),
                 "text": meta["text"],
                 "source": meta["source"],
                 "page": meta["page"],
                 "score": float(score)
             })
 
-        selected = []
+        return candidates
 
-        while len(selected) < top_k and candidates:
-            best_idx = -1
-            best_score = -1
+    def search_mmr(self, query_embedding, top_k=3, fetch_k=10, lambda_mult=0.5,
+                   filters: dict = None):
+        query_embedding = query_embedding / np.linalg.norm(query_embedding)
+        candidates = self.mmr_candidates(query_embedding, fetch_k, filters)
+        return mmr_select(query_embedding, candidates, top_k, lambda_mult)
 
-            for i, c in enumerate(candidates):
-                relevance = cosine_sim(query_embedding, c["embedding"])
+    def search_mmr_batch(self, query_embeddings, top_k=3, fetch_k=10, lambda_mult=0.5,
+                         filters: dict = None):
+        """
+        MMR search for many queries at once: one matrix FAISS search and a
+        vectorized MMR pass. Returns one result list per query.
+        """
+        queries = _normalize_rows(query_embeddings)
+        per_query = self.mmr_candidates_batch(queries, fetch_k, filters)
+        return mmr_select_batch(queries, per_query, top_k, lambda_mult)
 
-                diversity = 0
-                if selected:
-                    diversity = max(
-                        cosine_sim(c["embedding"], s["embedding"])
-                        for s in selected
-                    )
+    def warmup(self, block_rows: int = 65536) -> int:
+        """
+        Fault in what the first real query would otherwise wait for: run
+        one MMR search and read the memory-mapped exact vectors once.
+        Returns the number of rows touched.
+        """
+        snap = self._snapshot
+        n = snap.index.ntotal
+        if n == 0:
+            return 0
 
-                mmr_score = lambda_mult * relevance - (1 - lambda_mult) * diversity
+        self.search_mmr(np.ones(self.dim, dtype="float32"), top_k=1)
+        if snap.vectors is not None:
+            for start in range(0, n, block_rows):
+                np.asarray(snap.vectors[start:start + block_rows]).sum()
+        return n
 
-                if mmr_score > best_score:
-                    best_score = mmr_score
-                    best_idx = i
+    # -----------------------------
+    # Persistence
+    # -----------------------------
+    def save(self, path: str, meta_path: str):
+        """
+        Write the current snapshot to disk. `meta_path` is the commit record:
+        it holds the metadata rows and names the index and exact vectors
+        files they belong to. The index goes to a unique temp file (and a
+        rebuilt or compacted vectors file keeps its private name), the
+        record is renamed into place, and only then are the others renamed
+        over `path` and `vectors_path`. A reader never pairs metadata with
+        the wrong index or vectors: `load` finishes the renames if a save
+        was interrupted, and retries if a newer save replaced the record.
+        Concurrent saves are serialized.
+        """
+        with self._save_lock:
+            with self._write_lock:
+                snap = self._snapshot
+                vectors = None
+                if snap.vectors is not None and self.vectors_path is not None:
+                    vectors = self._pin_vectors()
 
-            selected.append(candidates[best_idx])
-            candidates.pop(best_idx)   # ✅ SAFE removal
+            committed = False
+            fd, index_tmp = _temp_file(path)
+            meta_fd, meta_tmp = _temp_file(meta_path)
+            try:
+                os.close(fd)
+                faiss.write_index(snap.index, index_tmp)
+                record = {
+                    "metadata": list(snap.metadata),
+                    "index": os.path.basename(index_tmp),
+                    "index_ino": os.stat(index_tmp).st_ino,
+                }
+                if vectors is not None:
+                    record["vectors"], record["vectors_ino"] = vectors
+                with os.fdopen(meta_fd, "wb") as f:
+                    pickle.dump(record, f)
+                os.replace(meta_tmp, meta_path)
+                committed = True
+            except BaseException:
+                for name in (index_tmp, meta_tmp):
+                    if os.path.exists(name):
+                        os.unlink(name)
+                raise
+            finally:
+                self._unpin_vectors(committed)
 
-        return selected
+            _finish_rename(index_tmp, path)
 
+    def load(self, path: str, meta_path: str):
+        """
+        Load an index written by `save`. The storage mode follows the file,
+        not the constructor; quantized indexes need `vectors_path` to point
+        at their side file.
+        """
+        vectors_file = None
+        for _ in range(LOAD_ATTEMPTS):
+            with open(meta_path, "rb") as meta_file:
+                record = pickle.load(meta_file)
+                if isinstance(record, list):
+                    # Saved before commit records: a plain list of metadata rows
+                    metadata = record
+                    index = faiss.read_index(path)
+                    break
 
-    def save(self, path: str):
-        faiss.write_index(self.index, path)
+                metadata = record["metadata"]
+                opened = [_open_committed(path, record["index"], record["index_ino"])]
+                if "vectors" in record and self.vectors_path is not None:
+                    opened.append(_open_committed(
+                        self.vectors_path, record["vectors"], record["vectors_ino"], writable=True
+                    ))
+                # Inode numbers of replaced files get reused, so a match
+                # only counts if no newer record was committed meanwhile
+                # (the open record's own inode cannot be reused).
+                if all(f is not None for f, _ in opened) and os.path.samestat(
+                    os.fstat(meta_file.fileno()), os.stat(meta_path)
+                ):
+                    for (_, name), target in zip(opened, (path, self.vectors_path)):
+                        _finish_rename(name, target)
+                    with opened[0][0] as f:
+                        index = faiss.read_index(faiss.PyCallbackIOReader(f.read))
+                    if len(opened) > 1:
+                        vectors_file = opened[1][0]
+                    break
+            for f, _ in opened:
+                if f is not None:
+                    f.close()
+            time.sleep(0.05)
+        else:
+            raise RuntimeError(f"{path} kept changing while loading it; is another process saving it?")
 
-    def load(self, path: str, metadata: list):
-        self.index = faiss.read_index(path)
-        self.metadata = metadata
+        if index.ntotal != len(metadata):
+            raise RuntimeError(
+                f"{path} has {index.ntotal} rows but {meta_path} has {len(metadata)}"
+            )
+        storage = _storage_of(index, self.dim)
+
+        vectors = None
+        if storage != "flat" and vectors_file is None:
+            if self.vectors_path is None or not os.path.exists(self.vectors_path):
+                raise RuntimeError(
+                    f"{path} uses {storage} storage but its exact vectors file is missing"
+                )
+            vectors_file = _open_writable(self.vectors_path)
+        if vectors_file is not None and os.fstat(vectors_file.fileno()).st_size < index.ntotal * self.dim * 4:
+            vectors_file.close()
+            raise RuntimeError(f"{self.vectors_path} holds fewer rows than {path}")
+
+        with self._write_lock:
+            if storage != "flat":
+                f = vectors_file
+                if self._vectors_file is not None:
+                    self._vectors_file.close()
+                if self._vectors_name not in (None, self.vectors_path):
+                    os.unlink(self._vectors_name)
+                self._vectors_file, self._vectors_name = f, self.vectors_path
+                # Rows past ntotal come from an unsaved ingest; ignore them.
+                vectors = self._map_vectors(index.ntotal)
+
+            self.storage = storage
+            if storage == "prefix":
+                self.prefix_dims = index.d
+            self._publish(index, tuple(metadata), vectors)
+
+
+def _stress(storage: str, vectors_path: str = None):
+    """
+    Concurrent searches while writers keep publishing snapshots. Every hit
+    must have its metadata row, and an exact-match query must always return
+    the row it was added with.
+    """
+    import random
+    import time
+
+    DIM = 64
+    WRITERS, READERS = 2, 6
+    BATCHES, BATCH_SIZE = 40, 25
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((WRITERS * BATCHES * BATCH_SIZE, DIM)).astype("float32")
+
+    store = FaissVectorStore(dim=DIM, storage=storage, vectors_path=vectors_path, prefix_dims=DIM // 4)
+    store.add(vectors[0], {"text": "0", "source": "seed.pdf", "page": 1})
+
+    errors = []
+    searches = [0] * READERS
+    done = threading.Event()
+
+    def writer(w):
+        for b in range(BATCHES):
+            start = (w * BATCHES + b) * BATCH_SIZE
+            ids = range(max(start, 1), start + BATCH_SIZE)
+            store.add_batch(
+                vectors[list(ids)],
+                [{"text": str(i), "source": f"w{w}.pdf", "page": b} for i in ids],
+            )
+
+    def reader(r):
+        while not done.is_set():
+            snap = store.snapshot()
+            i = int(random.choice(snap.metadata)["text"])
+            try:
+                hits = store.search(vectors[i], top_k=5)
+                store.search_mmr(vectors[i], top_k=3)
+            except Exception as e:
+                errors.append(repr(e))
+                return
+            if not hits or hits[0]["text"] != str(i):
+                errors.append(f"query {i} returned {hits[:1]}")
+                return
+            searches[r] += 1
+
+    readers = [threading.Thread(target=reader, args=(r,)) for r in range(READERS)]
+    writers = [threading.Thread(target=writer, args=(w,)) for w in range(WRITERS)]
+
+    t0 = time.perf_counter()
+    for t in readers + writers:
+        t.start()
+    for t in writers:
+        t.join()
+    done.set()
+    for t in readers:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    print(f"[{storage}] snapshots: {store.version}, rows: {store.index.ntotal}, "
+          f"searches: {sum(searches)} in {elapsed:.2f}s")
+
+    assert store.index.ntotal == len(store.metadata) == len(vectors), "row count mismatch"
+    assert not errors, errors[:5]
+
+
+def _stress_saves(storage: str, directory: str):
+    """
+    Concurrent saves while a writer replaces papers and a reader keeps
+    loading the saved files. Every save must succeed, and every load must
+    pair each metadata row with its own vector.
+    """
+    DIM = 64
+    SAVERS, SAVES, ROUNDS = 4, 5, 30
+
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((ROUNDS + 1, 10, DIM)).astype("float32")
+    paths = [os.path.join(directory, f"{storage}.{name}") for name in ("index", "pkl", "f32")]
+
+    store = FaissVectorStore(dim=DIM, storage=storage, vectors_path=paths[2], prefix_dims=DIM // 4)
+    for paper in range(2):
+        store.add_batch(vectors[0], [{"text": f"0/{i}", "source": f"p{paper}.pdf"} for i in range(10)])
+    store.save(paths[0], paths[1])
+
+    errors = []
+    loads = [0]
+    done = threading.Event()
+
+    def saver():
+        for _ in range(SAVES):
+            try:
+                store.save(paths[0], paths[1])
+            except Exception as e:
+                errors.append(f"save: {e!r}")
+
+    def writer():
+        for r in range(1, ROUNDS + 1):
+            store.replace_sources(
+                [f"p{r % 2}.pdf"], vectors[r],
+                [{"text": f"{r}/{i}", "source": f"p{r % 2}.pdf"} for i in range(10)],
+            )
+
+    def loader():
+        while not done.is_set():
+            try:
+                loaded = FaissVectorStore(dim=DIM, vectors_path=paths[2])
+                loaded.load(paths[0], paths[1])
+            except Exception as e:
+                errors.append(f"load: {e!r}")
+                return
+            snap = loaded.snapshot()
+            rows = [tuple(map(int, m["text"].split("/"))) for m in snap.metadata]
+            expected = loaded._first_stage(_normalize_rows([vectors[r, j] for r, j in rows]))
+            if np.abs(snap.index.reconstruct_n(0, len(rows)) - expected).max() > 0.05:
+                errors.append("load: index rows do not match the metadata")
+                return
+            exact = _normalize_rows([vectors[r, j] for r, j in rows])
+            if snap.vectors is not None and not np.allclose(snap.vectors, exact, atol=1e-6):
+                errors.append("load: exact vectors do not match the metadata")
+                return
+            loads[0] += 1
+
+    threads = [threading.Thread(target=saver) for _ in range(SAVERS)]
+    threads += [threading.Thread(target=writer)]
+    reader = threading.Thread(target=loader)
+    reader.start()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    store.save(paths[0], paths[1])
+    done.set()
+    reader.join()
+
+    final = FaissVectorStore(dim=DIM, vectors_path=paths[2])
+    final.load(paths[0], paths[1])
+    print(f"[{storage}] saves: {SAVERS * SAVES + 1}, loads: {loads[0]}")
+
+    assert not errors, errors[:5]
+    assert final.metadata == store.metadata, "saved metadata differs from the store"
+    leftovers = [n for n in os.listdir(directory) if n.endswith(".tmp")]
+    assert not leftovers, leftovers
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in STORAGE_MODES:
+            _stress(mode, os.path.join(tmp, f"{mode}.f32"))
+        for mode in STORAGE_MODES:
+            os.mkdir(os.path.join(tmp, mode))
+            _stress_saves(mode, os.path.join(tmp, mode))
+
+    print("Snapshot stress test passed ✅")
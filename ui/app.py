@@ -2,7 +2,6 @@
 import streamlit as st
 import requests
 import uuid
-import difflib
 import time
 
 # -----------------------------
@@ -32,7 +31,39 @@ UPLOAD_URL = f"{API_BASE}/upload"
 SUMMARY_URL = f"{API_BASE}/summarize"
 COMPARE_URL = f"{API_BASE}/compare"
 PAPERS_URL = f"{API_BASE}/papers"
-PAPER_TEXT_URL = f"{API_BASE}/paper_text"
+PAPER_DIFF_URL = f"{API_BASE}/paper_diff"
+COLLECTIONS_URL = f"{API_BASE}/collections"
+PAPER_STATS_URL = f"{API_BASE}/paper_stats"
+INDEX_VERSION_URL = f"{API_BASE}/index_version"
+
+# Seconds between index-version checks; our own uploads refresh it at once
+INDEX_VERSION_TTL = 30
+
+
+# -----------------------------
+# Cached reads (keyed by index version)
+# -----------------------------
+@st.cache_data(ttl=INDEX_VERSION_TTL, show_spinner=False)
+def index_version():
+    r = requests.get(INDEX_VERSION_URL, timeout=5)
+    r.raise_for_status()
+    return r.json()["version"]
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _fetch_json(url, version, params):
+    r = requests.get(url, params=params, timeout=10)
+    r.raise_for_status()
+    return r.json()
+
+
+def get_data(url, params=None):
+    """
+    GET a data endpoint, cached until the index version changes: reruns
+    with an unchanged index make no requests. Raises if the backend is down.
+    """
+    return _fetch_json(url, index_version(), params or {})
+
 
 # -----------------------------
 # Sidebar
@@ -43,32 +74,62 @@ with st.sidebar:
     role = st.radio("Role", ["Student", "Researcher", "Reviewer"])
     st.markdown("---")
 
+    # Collections (safe)
+    collections = []
+    try:
+        collections = [c["name"] for c in get_data(COLLECTIONS_URL).get("collections", [])]
+    except Exception:
+        pass
+
+    # Empty selection = search every collection
+    selected_collections = st.multiselect(
+        "Collections", collections, default=collections,
+        help="Questions, summaries and comparisons only use these collections"
+    )
+    collection_params = {"collections": selected_collections} if selected_collections else {}
+    st.markdown("---")
+
     # Fetch uploaded papers (safe)
-    papers = []
+    paper_stats = []
     try:
-        resp = requests.get(PAPERS_URL, timeout=5)
-        if resp.status_code == 200:
-            papers = resp.json().get("papers", [])
+        paper_stats = get_data(PAPER_STATS_URL, collection_params).get("papers", [])
     except Exception:
         # backend unreachable — show helpful text
         st.warning("Backend may be down — start the API server (uvicorn).")
 
-    if papers:
-        for p in papers:
-            st.write("•", p)
+    if paper_stats:
+        for p in paper_stats:
+            st.write("•", p["source"])
+            st.caption(f"{p['pages']} pages · {p['chunks']} chunks · {p['collection']}")
     else:
         st.info("No papers uploaded yet")
 
+    if st.button("🔄 Refresh"):
+        # Pick up papers added by other clients before the TTL runs out
+        index_version.clear()
+        st.rerun()
+
     st.markdown("---")
     st.subheader("➕ Upload PDF")
 
+    upload_options = collections or ["default"]
+    upload_collection = st.selectbox("Collection", upload_options + ["➕ New collection"])
+    if upload_collection == "➕ New collection":
+        upload_collection = st.text_input("New collection name").strip()
+
     uploaded_file = st.file_uploader("Choose a PDF", type=["pdf"])
-    if uploaded_file and st.button("Upload & Index"):
+    if uploaded_file and upload_collection and st.button("Upload & Index"):
         with st.spinner("Uploading and indexing..."):
             try:
-                r = requests.post(UPLOAD_URL, files={"file": uploaded_file}, timeout=120)
+                r = requests.post(
+                    UPLOAD_URL,
+                    files={"file": uploaded_file},
+                    params={"collection": upload_collection},
+                    timeout=120
+                )
                 if r.status_code == 200:
                     st.success("Uploaded successfully ✅")
+                    index_version.clear()
                     time.sleep(0.5)
                     st.rerun()
                 else:
@@ -121,7 +182,8 @@ if mode == "Chat":
                         json={
                             "question": question,
                             "session_id": st.session_state.session_id,
-                            "role": role.lower()
+                            "role": role.lower(),
+                            **collection_params
                         },
                         timeout=60
                     )
@@ -160,7 +222,11 @@ elif mode == "Summarize":
     if st.button("Summarize Papers"):
         with st.spinner("Summarizing..."):
             try:
-                r = requests.post(SUMMARY_URL, params={"role": role.lower()}, timeout=120)
+                r = requests.post(
+                    SUMMARY_URL,
+                    params={"role": role.lower(), **collection_params},
+                    timeout=120
+                )
                 if r.status_code == 200:
                     st.subheader("Summary")
                     st.write(r.json().get("summary", ""))
@@ -179,11 +245,7 @@ elif mode == "Compare":
 
     # Refresh papers list safely
     try:
-        resp = requests.get(PAPERS_URL, timeout=5)
-        if resp.status_code == 200:
-            papers = resp.json().get("papers", [])
-        else:
-            papers = []
+        papers = get_data(PAPERS_URL, collection_params).get("papers", [])
     except Exception:
         papers = []
 
@@ -206,7 +268,8 @@ elif mode == "Compare":
                         json={
                             "paper_a": paper_a,
                             "paper_b": paper_b,
-                            "role": role.lower()
+                            "role": role.lower(),
+                            **collection_params
                         },
                         timeout=120
                     )
@@ -220,35 +283,43 @@ elif mode == "Compare":
                 except Exception as e:
                     st.error(f"Request failed: {e}")
 
-            # -------- DIFF VIEW (uses /paper_text) --------
+            # -------- DIFF VIEW (uses /paper_diff) --------
             try:
-                r1 = requests.get(PAPER_TEXT_URL, params={"name": paper_a}, timeout=30)
-                r2 = requests.get(PAPER_TEXT_URL, params={"name": paper_b}, timeout=30)
-                if r1.status_code == 200 and r2.status_code == 200:
-                    t1 = r1.json().get("text", "")
-                    t2 = r2.json().get("text", "")
-                else:
-                    t1 = t2 = ""
+                r = requests.post(
+                    PAPER_DIFF_URL,
+                    json={"paper_a": paper_a, "paper_b": paper_b, **collection_params},
+                    timeout=60
+                )
+                diff = r.json() if r.status_code == 200 else None
             except Exception:
-                t1 = t2 = ""
+                diff = None
 
-            if t1 and t2:
+            if diff:
                 st.markdown("---")
-                if st.checkbox("Show text diff (sampled)"):
-                    diff = difflib.unified_diff(
-                        t1.splitlines()[:500],
-                        t2.splitlines()[:500],
-                        fromfile=paper_a,
-                        tofile=paper_b,
-                        lineterm=""
-                    )
-                    diff_text = "\n".join(diff)
-                    if diff_text.strip() == "":
-                        st.info("No differences found in sampled text.")
-                    else:
-                        st.code(diff_text)
+                st.subheader("🧬 Semantic Diff")
+                m1, m2, m3 = st.columns(3)
+                m1.metric("Similarity", f"{diff['similarity']:.2f}")
+                m2.metric("A covered by B", f"{diff['coverage_a']:.0%}")
+                m3.metric("B covered by A", f"{diff['coverage_b']:.0%}")
+
+                def _pages(span):
+                    lo, hi = span["pages"]
+                    return f"p. {lo}" if lo == hi else f"pp. {lo}–{hi}"
+
+                with st.expander(f"Matching sections ({len(diff['matches'])})"):
+                    for m in diff["matches"]:
+                        st.markdown(f"**{m['score']:.2f}** · A {_pages(m['a'])} ↔ B {_pages(m['b'])}")
+                        left, right = st.columns(2)
+                        left.caption(m["a"]["text"])
+                        right.caption(m["b"]["text"])
+
+                for key, label in (("unique_a", paper_a), ("unique_b", paper_b)):
+                    with st.expander(f"Only in {label} ({len(diff[key])})"):
+                        for span in diff[key]:
+                            st.markdown(f"**{_pages(span)}**")
+                            st.caption(span["text"])
             else:
-                st.info("No text available for diff (maybe /paper_text missing or backend unreachable).")
+                st.info("No diff available (maybe /paper_diff missing or backend unreachable).")
 
 # Footer
 st.markdown("---")